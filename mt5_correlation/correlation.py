@@ -1,5 +1,6 @@
 import math
 import logging
+import numpy as np
 import pandas as pd
 from datetime import datetime, timedelta
 import time
@@ -73,6 +74,10 @@ STATUS_CONVERGING = CorrelationStatus(5, 'CONVERGING', 'Coefficients, when order
                                                        'divergence threshold and the longest timeframe is below the '
                                                        'divergence threshold')
 
+# Buffer size in bytes for reading and writing coefficient data files. Larger than the default so that large files are
+# read and written with fewer system calls.
+FILE_BUFFER_SIZE = 256 * 1024
+
 
 class Correlation:
     """
@@ -96,12 +101,13 @@ class Correlation:
     # Toggle on whether we are monitoring or not. Set through start_monitor and stop_monitor
     __monitoring = False
 
-    # Monitoring calculation params, interval, cache_time, autosave and filename. Passed to start_monitor
+    # Monitoring calculation params, interval, cache_time, autosave, filename and on_update. Passed to start_monitor
     __monitoring_params = []
     __interval = None
     __cache_time = None
     __autosave = None
     __filename = None
+    __on_update = None
 
     # First run of scheduler
     __first_run = True
@@ -117,6 +123,14 @@ class Correlation:
     # Dict: {Symbol: [retrieved datetime, ticks dataframe]}
     __monitor_tick_data = {}
 
+    # Stores the tick data resampled to 1 sec OHLC prices during Monitor, with the ticks they were resampled from.
+    # Dict: {Symbol: [ticks dataframe, prices dataframe]}
+    __resampled_tick_data = {}
+
+    # Incremented whenever the coefficient data or history changes. Allows callers to check whether data has changed
+    # since they last read it.
+    __version = 0
+
     def __init__(self, monitoring_threshold=0.9, divergence_threshold=0.8, monitor_inverse=False):
         """
         Initialises the Correlation class.
@@ -143,6 +157,13 @@ class Correlation:
         self.divergence_threshold = divergence_threshold
         self.monitor_inverse = monitor_inverse
 
+    @property
+    def version(self):
+        """
+        :return: A number that is incremented every time the coefficient data or coefficient history changes.
+        """
+        return self.__version
+
     @property
     def filtered_coefficient_data(self):
         """
@@ -197,15 +218,18 @@ class Correlation:
         :return:
         """
         # Load data
-        with open(filename, 'rb') as file:
+        with open(filename, 'rb', buffering=FILE_BUFFER_SIZE) as file:
             loaded_dict = pickle.load(file)
 
         # Get data from loaded dict and save
         self.coefficient_data = loaded_dict["coefficient_data"]
         self.__price_data = loaded_dict["price_data"]
         self.__monitor_tick_data = loaded_dict["monitor_tick_data"]
+        self.__resampled_tick_data = {}
         self.coefficient_history = loaded_dict["coefficient_history"]
 
+        self.__version += 1
+
     def save(self, filename):
         """
         Saves the calculated coefficients, the price data used to calculate and the tick data for monitoring to a file.
@@ -215,7 +239,7 @@ class Correlation:
         # Add data to dict then use pickle to save
         save_dict = {"coefficient_data": self.coefficient_data, "price_data": self.__price_data,
                      "monitor_tick_data": self.__monitor_tick_data, "coefficient_history": self.coefficient_history}
-        with open(filename, 'wb') as file:
+        with open(filename, 'wb', buffering=FILE_BUFFER_SIZE) as file:
             pickle.dump(save_dict, file, protocol=pickle.HIGHEST_PROTOCOL)
 
     def calculate(self, date_from, date_to, timeframe, min_prices=100, max_set_size_diff_pct=90, overlap_pct=90,
@@ -260,7 +284,8 @@ class Correlation:
 
         # Loop through all symbol pair combinations and calculate coefficient. Make sure you don't double count pairs
         # eg. (USD/GBP AUD/USD vs AUD/USD USD/GBP). Use grid of all symbols with i and j axis. j starts at i + 1 to
-        # avoid duplicating. We will store all coefficients in a dataframe.
+        # avoid duplicating. We will collect the coefficients and store them all in a dataframe once calculated.
+        coefficient_rows = []
         index = 0
         # There will be (x^2 - x) / 2 pairs where x is number of symbols
         num_pair_combinations = int((len(symbols) ** 2 - len(symbols)) / 2)
@@ -287,11 +312,9 @@ class Correlation:
                 # Store if valid
                 if coefficient is not None:
 
-                    self.coefficient_data = \
-                        self.coefficient_data.append({'Symbol 1': symbol1, 'Symbol 2': symbol2,
-                                                      'Base Coefficient': coefficient, 'UTC Date From': date_from,
-                                                      'UTC Date To': date_to, 'Timeframe': timeframe, 'Status': ''},
-                                                     ignore_index=True)
+                    coefficient_rows.append({'Symbol 1': symbol1, 'Symbol 2': symbol2,
+                                             'Base Coefficient': coefficient, 'UTC Date From': date_from,
+                                             'UTC Date To': date_to, 'Timeframe': timeframe, 'Status': ''})
 
                     self.__log.debug(f"Pair {index} of {num_pair_combinations}: {symbol1}:{symbol2} has a "
                                      f"coefficient of {coefficient}.")
@@ -299,13 +322,17 @@ class Correlation:
                     self.__log.debug(f"Coefficient for pair {index} of {num_pair_combinations}: {symbol1}:"
                                      f"{symbol2} could no be calculated.")
 
-        # Sort, highest correlated first
-        self.coefficient_data = self.coefficient_data.sort_values('Base Coefficient', ascending=False)
+        # Store the coefficients and sort, highest correlated first. Last Calculation is stored as UTC datetime.
+        coefficient_data = pd.DataFrame(columns=self.coefficient_data.columns, data=coefficient_rows)
+        coefficient_data['Last Calculation'] = pd.to_datetime(coefficient_data['Last Calculation'], utc=True)
+        self.coefficient_data = coefficient_data.sort_values('Base Coefficient', ascending=False)
+        self.__version += 1
 
         # If we were monitoring, we stopped, so start again.
         if was_monitoring:
             self.start_monitor(interval=self.__interval, calculation_params=self.__monitoring_params,
-                               cache_time=self.__cache_time, autosave=self.__autosave, filename=self.__filename)
+                               cache_time=self.__cache_time, autosave=self.__autosave, filename=self.__filename,
+                               on_update=self.__on_update)
 
     def get_price_data(self, symbol):
         """
@@ -319,7 +346,8 @@ class Correlation:
 
         return price_data
 
-    def start_monitor(self, interval, calculation_params, cache_time=10, autosave=False, filename='autosave.cpd'):
+    def start_monitor(self, interval, calculation_params, cache_time=10, autosave=False, filename='autosave.cpd',
+                      on_update=None):
         """
         Starts monitor to continuously update the coefficient for all symbol pairs in that meet the min_coefficient
         threshold.
@@ -344,6 +372,8 @@ class Correlation:
         :param autosave: Whether to autosave after every monitor run. If there is no filename specified then will
             create one named autosave.cpd
         :param filename: Filename for autosave. Default is autosave.cpd.
+        :param on_update: Optional function to call after every monitor run that updated the coefficients. Called with
+            no arguments from the monitoring thread.
 
         :return: correlation coefficient, or None if coefficient could not be calculated.
         """
@@ -366,6 +396,7 @@ class Correlation:
         self.__cache_time = cache_time
         self.__autosave = autosave
         self.__filename = filename
+        self.__on_update = on_update
 
         # Create thread to run monitoring This will call private __monitor method that will run the calculation and
         # keep scheduling itself while self.monitoring is True.
@@ -409,7 +440,10 @@ class Correlation:
         # the size of the largest set and is the overlap set size at least overlap_pct % the size of the smallest set?
         coefficient = None
 
-        intersect_dates = (set(symbol1_prices['time']) & set(symbol2_prices['time']))
+        # Times that are in both sets, and the positions of those times in each set
+        intersect_dates, symbol1_indices, symbol2_indices = \
+            np.intersect1d(symbol1_prices['time'].to_numpy(), symbol2_prices['time'].to_numpy(),
+                           assume_unique=True, return_indices=True)
         len_smallest_set = int(min([len(symbol1_prices.index), len(symbol2_prices.index)]))
         len_largest_set = int(max([len(symbol1_prices.index), len(symbol2_prices.index)]))
         similar_size = len_largest_set * (max_set_size_diff_pct / 100) <= len_smallest_set
@@ -420,13 +454,13 @@ class Correlation:
         if suitable:
             # Calculate coefficient on close prices
 
-            # First filter prices to only include those that intersect
-            symbol1_prices_filtered = symbol1_prices[symbol1_prices['time'].isin(intersect_dates)]
-            symbol2_prices_filtered = symbol2_prices[symbol2_prices['time'].isin(intersect_dates)]
+            # First filter prices to only include those that intersect. Prices are aligned by time.
+            symbol1_prices_filtered = symbol1_prices['close'].to_numpy(dtype=float)[symbol1_indices]
+            symbol2_prices_filtered = symbol2_prices['close'].to_numpy(dtype=float)[symbol2_indices]
 
             # Calculate coefficient. Only use if p value is < max_p_value (highly likely that coefficient is valid
             # and null hypothesis is false).
-            coefficient_with_p_value = pearsonr(symbol1_prices_filtered['close'], symbol2_prices_filtered['close'])
+            coefficient_with_p_value = pearsonr(symbol1_prices_filtered, symbol2_prices_filtered)
             coefficient = None if coefficient_with_p_value[1] > max_p_value else coefficient_with_p_value[0]
 
             # If NaN, change to None
@@ -479,10 +513,13 @@ class Correlation:
 
         # Clear tick data
         self.__monitor_tick_data = {}
+        self.__resampled_tick_data = {}
 
         # Clear status from coefficient data
         self.coefficient_data['Status'] = ''
 
+        self.__version += 1
+
     def get_ticks(self, symbol, date_from=None, date_to=None, cache_only=False):
         """
         Returns the ticks for the specified symbol. Get's from cache if available and not older than cache_timeframe.
@@ -556,7 +593,7 @@ class Correlation:
 
             # Get max date from column
             if col is not None and len(col) > 0:
-                last_calc = max(col.values)
+                last_calc = col.max()
 
         return last_calc
 
@@ -588,8 +625,11 @@ class Correlation:
 
         # Only run if monitor is not stopped
         if self.__monitoring:
-            # Update all coefficients
+            # Update all coefficients. Notify if they have changed.
+            version = self.__version
             self.__update_all_coefficients()
+            if self.__on_update is not None and self.__version != version:
+                self.__on_update()
 
             # Autosave
             if self.__autosave:
@@ -633,26 +673,19 @@ class Correlation:
         symbol2ticks = self.get_ticks(symbol=symbol2, date_from=date_from, date_to=date_to)
 
         # Resample to 1 sec OHLC, this will help with coefficient calculation ensuring that we dont have more than
-        # one tick per second and ensuring that times can match. We will need to set the index to time for the
-        # resample then revert back to a 'time' column. We will then need to remove rows with nan in 'close' price
+        # one tick per second and ensuring that times can match. Resampled prices are reused for symbols that are in
+        # more than one pair.
         s1_prices = None
         s2_prices = None
         if symbol1ticks is not None and symbol2ticks is not None and len(symbol1ticks.index) > 0 and \
                 len(symbol2ticks.index) > 0:
 
             try:
-                symbol1ticks = symbol1ticks.set_index('time')
-                symbol2ticks = symbol2ticks.set_index('time')
-                s1_prices = symbol1ticks['ask'].resample('1S').ohlc()
-                s2_prices = symbol2ticks['ask'].resample('1S').ohlc()
+                s1_prices = self.__resample_ticks(symbol=symbol1, ticks=symbol1ticks)
+                s2_prices = self.__resample_ticks(symbol=symbol2, ticks=symbol2ticks)
             except RecursionError:
                 self.__log.warning(f"Coefficient could not be calculated for {symbol1}:{symbol2}. prices could not "
                                    f"be resampled.")
-            else:
-                s1_prices.reset_index(inplace=True)
-                s2_prices.reset_index(inplace=True)
-                s1_prices = s1_prices[s1_prices['close'].notna()]
-                s2_prices = s2_prices[s2_prices['close'].notna()]
 
             # Calculate for all sets of monitoring_params
             if s1_prices is not None and s2_prices is not None:
@@ -683,6 +716,26 @@ class Correlation:
                 self.__update_coefficient_data(symbol1=symbol1, symbol2=symbol2, coefficients=coefficients,
                                                date_to=date_to)
 
+    def __resample_ticks(self, symbol, ticks):
+        """
+        Resamples ticks to 1 sec OHLC prices. Rows with no close price are removed. A symbol can be in many pairs so the
+        resampled prices are cached against the ticks that they were resampled from and are only resampled again when
+        the ticks change.
+        :param symbol: The symbol that the ticks are for
+        :param ticks: The ticks to resample
+        :return: Dataframe of prices with a 'time' column
+        """
+        cached = self.__resampled_tick_data.get(symbol)
+        if cached is not None and cached[0] is ticks:
+            return cached[1]
+
+        prices = ticks.set_index('time')['ask'].resample('1S').ohlc()
+        prices.reset_index(inplace=True)
+        prices = prices[prices['close'].notna()]
+        self.__resampled_tick_data[symbol] = [ticks, prices]
+
+        return prices
+
     def __update_all_coefficients(self):
         """
         Updates the coefficient for all symbol pairs in that meet the min_coefficient threshold. Symbol pairs that meet
@@ -702,7 +755,9 @@ class Correlation:
         # Create dataframes for coefficient data.
         coefficient_data_columns = ['Symbol 1', 'Symbol 2', 'Base Coefficient', 'UTC Date From', 'UTC Date To',
                                     'Timeframe', 'Last Calculation', 'Status']
-        self.coefficient_data = pd.DataFrame(columns=coefficient_data_columns)
+        coefficient_data = pd.DataFrame(columns=coefficient_data_columns)
+        coefficient_data['Last Calculation'] = pd.to_datetime(coefficient_data['Last Calculation'], utc=True)
+        self.coefficient_data = coefficient_data
 
         # Clear coefficient history
         self.clear_coefficient_history()
@@ -725,10 +780,11 @@ class Correlation:
 
         # Update data if we have a coefficient and add to history
         if coefficients is not None:
-            # Update the coefficient data table with the Last Calculation time.
+            # Update the coefficient data table with the Last Calculation time. Set as a UTC timestamp to match the
+            # column type.
             self.coefficient_data.loc[(self.coefficient_data['Symbol 1'] == symbol1) &
                                       (self.coefficient_data['Symbol 2'] == symbol2),
-                                      'Last Calculation'] = now
+                                      'Last Calculation'] = pd.Timestamp(now).tz_convert('UTC')
 
             # Are we an inverse correlation
             inverse = self.get_base_coefficient(symbol1, symbol2) <= self.monitoring_threshold * -1
@@ -745,6 +801,8 @@ class Correlation:
                                    data=[[symbol1, symbol2, coefficients[key], key, date_to]])
                 self.coefficient_history = self.coefficient_history.append(row)
 
+            self.__version += 1
+
     def __calculate_status(self, coefficients, inverse):
         """
         Calculates the status from the supplied set of coefficients
@@ -0,0 +1,177 @@
+"""
+Helpers shared by the graph frames. Importing this module configures matplotlib for the graph frames, so it should be
+imported before any other matplotlib modules.
+"""
+import matplotlib
+import numpy as np
+import wx
+
+# Select the wx backend so that a default backend does not need to be resolved.
+matplotlib.use('WXAgg')
+
+# Simplify line paths and render them in chunks so that long price and tick series draw quickly. Simplification removes
+# vertices that don't change the rendered line.
+matplotlib.rcParams['path.simplify'] = True
+matplotlib.rcParams['path.simplify_threshold'] = 1.0
+matplotlib.rcParams['agg.path.chunksize'] = 10000
+
+# Minimum number of points to plot per line, regardless of canvas size.
+MIN_POINTS = 1000
+
+
+def max_points(canvas):
+    """
+    Gets the maximum number of points worth plotting on a line for the canvas. Two per pixel of canvas width.
+    :param canvas: The canvas that the line will be drawn on
+    :return: max points
+    """
+    return max(MIN_POINTS, canvas.GetSize().GetWidth() * 2)
+
+
+def downsample(x, y, max_points):
+    """
+    Downsamples the x and y data so that no more than max_points are plotted. Charts are limited by their width in
+    pixels so plotting more points than this would not change the rendered chart. Data is split into equal sized
+    buckets and the points with the minimum and maximum y value in each bucket are kept, so that spikes in the data are
+    still shown. Missing y values are ignored when finding the minimum and maximum. Buckets with no y values keep their
+    first point so that gaps in the data are still shown.
+    :param x: NumPy array of x values
+    :param y: NumPy array of y values. Can contain NaN or None where values are missing.
+    :param max_points: The maximum number of points to return
+    :return: x, y. y is returned as a float array, with None converted to NaN.
+    """
+    y = np.asarray(y, dtype=float)
+    if len(x) <= max_points:
+        return x, y
+
+    # Two points are kept per bucket. Ceiling division so that we never return more than max_points.
+    bucket_size = -(-len(x) // (max_points // 2))
+
+    # Indices of the min and max of each full bucket, then of the remaining partial bucket if there is one
+    num_buckets = len(x) // bucket_size
+    end = num_buckets * bucket_size
+    indices = [_min_max_indices(y[:end].reshape(num_buckets, bucket_size))]
+    if end < len(x):
+        indices.append(_min_max_indices(y[end:].reshape(1, -1), offset=end))
+
+    # Keep the points in order. Where the min and max of a bucket are the same point, it is only kept once.
+    indices = np.unique(np.concatenate(indices))
+
+    return x[indices], y[indices]
+
+
+def _min_max_indices(buckets, offset=0):
+    """
+    Gets the indices of the minimum and maximum values in each bucket, ignoring NaN. Returns the first index for buckets
+    that are all NaN.
+    :param buckets: 2D NumPy array with one row per bucket
+    :param offset: The index of the first value of the first bucket
+    :return: NumPy array of indices, two per bucket
+    """
+    # NaN is replaced with values that can never be selected as the minimum or maximum
+    missing = np.isnan(buckets)
+    offsets = np.arange(len(buckets)) * buckets.shape[1] + offset
+    return np.concatenate([np.where(missing, np.inf, buckets).argmin(axis=1) + offsets,
+                           np.where(missing, -np.inf, buckets).argmax(axis=1) + offsets])
+
+
+class RefreshTracker:
+    """
+    Tracks the data that a graph was last refreshed with and whether that refresh has been drawn. Graph frames use this
+    to skip refreshing when nothing has changed, and to defer refreshing until the last refresh has been drawn so that
+    refreshes don't stack up.
+    """
+
+    # The canvas being drawn and the function that refreshes the graph
+    __canvas = None
+    __refresh = None
+
+    # Set when a redraw has been requested and cleared once the canvas has drawn
+    __draw_pending = False
+
+    # Set when a refresh was deferred as a draw was pending. The graph is refreshed once the canvas has drawn.
+    __refresh_deferred = False
+
+    # The data version and settings, and the tick data, that the graph was last refreshed with
+    __refreshed_with = None
+    __refreshed_ticks = None
+
+    def __init__(self, canvas, refresh):
+        """
+        Creates a tracker for the canvas
+        :param canvas: The canvas that the graph is drawn on
+        :param refresh: The function that refreshes the graph. Called to run refreshes that were deferred.
+        """
+        self.__canvas = canvas
+        self.__refresh = refresh
+        self.__canvas.mpl_connect('draw_event', self.__on_draw)
+
+    @property
+    def draw_pending(self):
+        """
+        :return: True if a redraw has been requested and the canvas has not yet drawn
+        """
+        return self.__draw_pending
+
+    def defer(self):
+        """
+        Checks whether the refresh should be deferred as the last refresh has not yet been drawn. If it should, the
+        graph will be refreshed once the canvas has drawn.
+        :return: True if the refresh should be deferred
+        """
+        if self.__draw_pending:
+            self.__refresh_deferred = True
+
+        return self.__draw_pending
+
+    @property
+    def refreshed_with(self):
+        """
+        :return: The data version and settings that the graph was last refreshed with
+        """
+        return self.__refreshed_with
+
+    def changed(self, refresh_with, ticks):
+        """
+        Checks whether the data or settings have changed since the graph was last refreshed. If they have, they are
+        stored as the ones that the graph is being refreshed with.
+        :param refresh_with: The data version and settings to refresh with. Compared by equality.
+        :param ticks: List of the tick data to refresh with. Compared by identity as tick data is replaced rather than
+            updated when new ticks are retrieved.
+        :return: True if the data or settings have changed
+        """
+        if refresh_with == self.__refreshed_with and len(ticks) == len(self.__refreshed_ticks) and \
+                all(new is old for new, old in zip(ticks, self.__refreshed_ticks)):
+            return False
+
+        self.__refreshed_with = refresh_with
+        self.__refreshed_ticks = ticks
+        return True
+
+    def draw(self):
+        """
+        Requests a redraw of the canvas. This will be drawn when the application is next idle.
+        :return:
+        """
+        self.__draw_pending = True
+        self.__canvas.draw_idle()
+
+    def __on_draw(self, event):
+        """
+        Canvas has been drawn. Clear the draw pending flag so that the next refresh can proceed, and run any refresh that
+        was deferred while the draw was pending. The refresh runs after the draw has completed.
+        :param event:
+        :return:
+        """
+        self.__draw_pending = False
+        if self.__refresh_deferred:
+            self.__refresh_deferred = False
+            wx.CallAfter(self.__run_deferred_refresh)
+
+    def __run_deferred_refresh(self):
+        """
+        Runs a deferred refresh, unless the canvas has been destroyed since it was requested
+        :return:
+        """
+        if self.__canvas:
+            self.__refresh()
@@ -1,17 +1,27 @@
 import abc
 import importlib
 import logging
+import threading
 
 import pytz
 import wx
 import wx.lib.inspection as ins
+import wx.lib.newevent
 import wxconfig
 import wxconfig as cfg
 
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 
 from mt5_correlation import correlation as cor
 
+# Posted to the MDI frame from the monitoring thread whenever a monitor run has updated the coefficients
+CoefficientsUpdatedEvent, EVT_COEFFICIENTS_UPDATED = wx.lib.newevent.NewEvent()
+
+# Interval in seconds of the heartbeat timer that refreshes child frames while monitoring. Frames are refreshed when
+# the coefficients are updated, so the heartbeat only picks up updates that were skipped while the frame was hidden.
+HEARTBEAT_INTERVAL = 60
+
 
 class CorrelationMDIFrame(wx.MDIParentFrame):
     """
@@ -24,22 +34,33 @@ class CorrelationMDIFrame(wx.MDIParentFrame):
     __opened_filename = None  # So we can save to same file as we opened
     __log = None  # The logger
     __menu_item_monitor = None  # We need to store this menu item so that we can check if it is checked or not.
+    __menu_items_busy = None  # Menu items that change or save the data. Disabled while a calculation or load runs.
+    __calc_executor = None  # Runs the coefficient calculation and file loading off the UI thread
+    __closing = None  # Set when the frame is closing so that the results of background work are ignored.
+    __refreshing = False  # Set while the timer is refreshing child frames so that timer events don't stack up.
+    __status_version = None  # The correlation data version that the status message was last updated for.
 
     def __init__(self):
+        config = cfg.Config()
+
         # Super
         wx.MDIParentFrame.__init__(self, parent=None, id=wx.ID_ANY, title="Divergence Monitor",
-                                   pos=wx.Point(x=cfg.Config().get('window.x'), y=cfg.Config().get('window.y')),
-                                   size=wx.Size(width=cfg.Config().get('window.width'),
-                                                height=cfg.Config().get('window.height')),
-                                   style=cfg.Config().get('window.style'))
+                                   pos=wx.Point(x=config.get('window.x'), y=config.get('window.y')),
+                                   size=wx.Size(width=config.get('window.width'), height=config.get('window.height')),
+                                   style=config.get('window.style'))
 
         # Create logger
         self.__log = logging.getLogger(__name__)
 
         # Create correlation instance to maintain state of calculated coefficients. Set params from config
-        self.cor = cor.Correlation(monitoring_threshold=cfg.Config().get("monitor.monitoring_threshold"),
-                                   divergence_threshold=cfg.Config().get("monitor.divergence_threshold"),
-                                   monitor_inverse=cfg.Config().get("monitor.monitor_inverse"))
+        monitor = config.get('monitor')
+        self.cor = cor.Correlation(monitoring_threshold=monitor['monitoring_threshold'],
+                                   divergence_threshold=monitor['divergence_threshold'],
+                                   monitor_inverse=monitor['monitor_inverse'])
+
+        # Single worker to run calculations and file loads in the background so that the UI remains responsive
+        self.__calc_executor = ThreadPoolExecutor(max_workers=1)
+        self.__closing = threading.Event()
 
         # Status bar. 2 fields, one for monitoring status and one for general status. On open, monitoring status is not
         # monitoring. SetBackgroundColour will change colour of both. Couldn't find a way to set on single field only.
@@ -52,30 +73,37 @@ class CorrelationMDIFrame(wx.MDIParentFrame):
 
         # File menu and items
         menu_file = wx.Menu()
-        self.Bind(wx.EVT_MENU, self.__on_open_file, menu_file.Append(wx.ID_ANY, "&Open", "Open correlations file."))
-        self.Bind(wx.EVT_MENU, self.__on_save_file, menu_file.Append(wx.ID_ANY, "Save", "Save correlations file."))
-        self.Bind(wx.EVT_MENU, self.__on_save_file_as,
-                  menu_file.Append(wx.ID_ANY, "Save As", "Save correlations file."))
+        menu_item_open = menu_file.Append(wx.ID_ANY, "&Open", "Open correlations file.")
+        self.Bind(wx.EVT_MENU, self.__on_open_file, menu_item_open)
+        menu_item_save = menu_file.Append(wx.ID_ANY, "Save", "Save correlations file.")
+        self.Bind(wx.EVT_MENU, self.__on_save_file, menu_item_save)
+        menu_item_save_as = menu_file.Append(wx.ID_ANY, "Save As", "Save correlations file.")
+        self.Bind(wx.EVT_MENU, self.__on_save_file_as, menu_item_save_as)
         menu_file.AppendSeparator()
-        self.Bind(wx.EVT_MENU, self.__on_open_settings,
-                  menu_file.Append(wx.ID_ANY, "Settings", "Change application settings."))
+        menu_item_settings = menu_file.Append(wx.ID_ANY, "Settings", "Change application settings.")
+        self.Bind(wx.EVT_MENU, self.__on_open_settings, menu_item_settings)
         menu_file.AppendSeparator()
         self.Bind(wx.EVT_MENU, self.__on_exit, menu_file.Append(wx.ID_ANY, "Exit", "Close the application"))
         self.menubar.Append(menu_file, "&File")
 
         # Coefficient menu and items
         menu_coef = wx.Menu()
-        self.Bind(wx.EVT_MENU, self.__on_calculate,
-                  menu_coef.Append(wx.ID_ANY, "Calculate", "Calculate base coefficients."))
+        menu_item_calculate = menu_coef.Append(wx.ID_ANY, "Calculate", "Calculate base coefficients.")
+        self.Bind(wx.EVT_MENU, self.__on_calculate, menu_item_calculate)
         self.__menu_item_monitor = menu_coef.Append(wx.ID_ANY, "Monitor",
                                                     "Monitor correlated pairs for changes to coefficient.",
                                                     kind=wx.ITEM_CHECK)
         self.Bind(wx.EVT_MENU, self.__on_monitor, self.__menu_item_monitor)
         menu_coef.AppendSeparator()
-        self.Bind(wx.EVT_MENU, self.__on_clear,
-                  menu_coef.Append(wx.ID_ANY, "Clear", "Clear coefficient and price history."))
+        menu_item_clear = menu_coef.Append(wx.ID_ANY, "Clear", "Clear coefficient and price history.")
+        self.Bind(wx.EVT_MENU, self.__on_clear, menu_item_clear)
         self.menubar.Append(menu_coef, "Coefficient")
 
+        # Menu items that would change the data, or save it part way through being rebuilt, while a calculation or load
+        # is running in the background
+        self.__menu_items_busy = [menu_item_open, menu_item_save, menu_item_save_as, menu_item_settings,
+                                  menu_item_calculate, self.__menu_item_monitor, menu_item_clear]
+
         # View menu and items
         menu_view = wx.Menu()
         self.Bind(wx.EVT_MENU, self.__on_view_status, menu_view.Append(wx.ID_ANY, "Status",
@@ -99,6 +127,12 @@ class CorrelationMDIFrame(wx.MDIParentFrame):
         self.timer = wx.Timer(self)
         self.Bind(wx.EVT_TIMER, self.__on_timer, self.timer)
 
+        # Refresh when the monitor has updated the coefficients
+        self.Bind(EVT_COEFFICIENTS_UPDATED, self.__on_timer)
+
+        # Catch up when restored, as refreshes are skipped while minimised
+        self.Bind(wx.EVT_ICONIZE, self.__on_iconize)
+
         # Bind window close event
         self.Bind(wx.EVT_CLOSE, self.__on_close, self)
 
@@ -108,21 +142,27 @@ class CorrelationMDIFrame(wx.MDIParentFrame):
         :param event:
         :return:
         """
+        config = cfg.Config()
+
         # Save pos and size
         x, y = self.GetPosition()
         width, height = self.GetSize()
-        cfg.Config().set('window.x', x)
-        cfg.Config().set('window.y', y)
-        cfg.Config().set('window.width', width)
-        cfg.Config().set('window.height', height)
+        config.set('window.x', x)
+        config.set('window.y', y)
+        config.set('window.width', width)
+        config.set('window.height', height)
 
         # Style
         style = self.GetWindowStyle()
-        cfg.Config().set('window.style', style)
+        config.set('window.style', style)
 
-        cfg.Config().save()
+        config.save()
 
-        # Stop monitoring
+        # Stop the calculation worker and monitoring. A calculation or load that is running can't be stopped, so wait
+        # for it to finish. Its result will be ignored. Nothing else can be queued as the menu items are disabled while
+        # one is running. The monitor is stopped afterwards as a calculation restarts it if it was running.
+        self.__closing.set()
+        self.__calc_executor.shutdown(wait=True)
         self.cor.stop_monitor()
 
         # End
@@ -137,14 +177,29 @@ class CorrelationMDIFrame(wx.MDIParentFrame):
             # Load the file chosen by the user.
             self.__opened_filename = fileDialog.GetPath()
 
+            # Load in the background
             self.SetStatusText(f"Loading file {self.__opened_filename}.", 1)
-            self.cor.load(self.__opened_filename)
+            filename = self.__opened_filename
+            self.__run_in_background(lambda f: self.__on_load_complete(f, filename), self.cor.load, filename)
 
-            # Show calculated data and refresh all opened frames
-            self.__on_view_status(evt)
-            self.__refresh()
+    def __on_load_complete(self, future, filename):
+        """
+        Load complete. Called on the UI thread.
+        :param future: The future for the load. Used to check whether it failed.
+        :param filename: The file that was loaded
+        :return:
+        """
+        # Report the error if the load failed
+        if future.exception() is not None:
+            self.__log.error(f"Error loading file {filename}: {future.exception()}")
+            self.SetStatusText(f"Error loading file {filename}. See log for details.", 1)
+            return
+
+        # Show loaded data and refresh all opened frames
+        self.__on_view_status(None)
+        self.__refresh()
 
-            self.SetStatusText(f"File {self.__opened_filename} loaded.", 1)
+        self.SetStatusText(f"File {filename} loaded.", 1)
 
     def __on_save_file(self, evt):
         self.SetStatusText(f"Saving file as {self.__opened_filename}", 1)
@@ -174,19 +229,23 @@ class CorrelationMDIFrame(wx.MDIParentFrame):
         settings_dialog = cfg.SettingsDialog(parent=self, exclude=['window'])
         res = settings_dialog.ShowModal()
         if res == wx.ID_OK:
+            # Monitor settings. Read the section once.
+            monitor = cfg.Config().get('monitor')
+
             # Stop the monitor
             self.cor.stop_monitor()
 
             # Build calculation params and restart the monitor
-            calculation_params = [cfg.Config().get('monitor.calculations.long'),
-                                  cfg.Config().get('monitor.calculations.medium'),
-                                  cfg.Config().get('monitor.calculations.short')]
+            calculation_params = [monitor['calculations']['long'],
+                                  monitor['calculations']['medium'],
+                                  monitor['calculations']['short']]
 
-            self.cor.start_monitor(interval=cfg.Config().get('monitor.interval'),
+            self.cor.start_monitor(interval=monitor['interval'],
                                    calculation_params=calculation_params,
-                                   cache_time=cfg.Config().get('monitor.tick_cache_time'),
-                                   autosave=cfg.Config().get('monitor.autosave'),
-                                   filename=self.__opened_filename)
+                                   cache_time=monitor['tick_cache_time'],
+                                   autosave=monitor['autosave'],
+                                   filename=self.__opened_filename,
+                                   on_update=self.__get_on_update())
 
             # Refresh all open child frames
             self.__refresh()
@@ -196,26 +255,86 @@ class CorrelationMDIFrame(wx.MDIParentFrame):
         self.Close()
 
     def __on_calculate(self, evt):
+        config = cfg.Config()
+
         # set time zone to UTC to avoid local offset issues, and get from and to dates (a week ago to today)
         timezone = pytz.timezone("Etc/UTC")
         utc_to = datetime.now(tz=timezone)
-        utc_from = utc_to - timedelta(days=cfg.Config().get('calculate.from.days'))
+        utc_from = utc_to - timedelta(days=config.get('calculate.from.days'))
+
+        # Calculation params. Read here so that the worker doesn't access config.
+        params = {'timeframe': config.get('calculate.timeframe'),
+                  'min_prices': config.get('calculate.min_prices'),
+                  'max_set_size_diff_pct': config.get('calculate.max_set_size_diff_pct'),
+                  'overlap_pct': config.get('calculate.overlap_pct'),
+                  'max_p_value': config.get('calculate.max_p_value')}
 
-        # Calculate
+        # Calculate in the background
         self.SetStatusText("Calculating coefficients.", 1)
-        self.cor.calculate(date_from=utc_from, date_to=utc_to,
-                           timeframe=cfg.Config().get('calculate.timeframe'),
-                           min_prices=cfg.Config().get('calculate.min_prices'),
-                           max_set_size_diff_pct=cfg.Config().get('calculate.max_set_size_diff_pct'),
-                           overlap_pct=cfg.Config().get('calculate.overlap_pct'),
-                           max_p_value=cfg.Config().get('calculate.max_p_value'))
+        self.__run_in_background(self.__on_calculate_complete, self.cor.calculate, date_from=utc_from, date_to=utc_to,
+                                 **params)
+
+    def __run_in_background(self, on_complete, fn, *args, **kwargs):
+        """
+        Runs a calculation or load on the background worker. The menu items that would change the data are disabled
+        until it completes, so that the user can't start monitoring, change settings, save or start another calculation
+        or load while the data is being rebuilt.
+        :param on_complete: Function to call on the UI thread with the future once complete. Not called if the frame is
+            closing.
+        :param fn: The function to run
+        :param args: Args for fn
+        :param kwargs: Keyword args for fn
+        :return:
+        """
+        for item in self.__menu_items_busy:
+            item.Enable(False)
+
+        # The done callback runs on the worker thread. It checks the closing flag through a local so that it doesn't
+        # touch the frame, which may have been destroyed.
+        closing = self.__closing
+        future = self.__calc_executor.submit(fn, *args, **kwargs)
+        future.add_done_callback(
+            lambda f: None if closing.is_set() else wx.CallAfter(self.__on_background_complete, f, on_complete))
+
+    def __on_background_complete(self, future, on_complete):
+        """
+        Background calculation or load complete. Called on the UI thread. Re-enables the menu items then calls
+        on_complete.
+        :param future: The future for the calculation or load
+        :param on_complete: Function to call with the future
+        :return:
+        """
+        # Ignore the result if the frame was closed after it was posted
+        if self.__closing.is_set():
+            return
+
+        for item in self.__menu_items_busy:
+            item.Enable(True)
+
+        on_complete(future)
+
+    def __on_calculate_complete(self, future):
+        """
+        Calculation complete. Called on the UI thread.
+        :param future: The future for the calculation. Used to check whether it failed.
+        :return:
+        """
+        # Report the error if the calculation failed
+        if future.exception() is not None:
+            self.__log.error(f"Error calculating coefficients: {future.exception()}")
+            self.SetStatusText("Error calculating coefficients. See log for details.", 1)
+            return
+
         self.SetStatusText("", 1)
 
         # Show calculated data and refresh frames
-        self.__on_view_status(evt)
+        self.__on_view_status(None)
         self.__refresh()
 
     def __on_monitor(self, evt):
+        # Monitor settings. Read the section once.
+        monitor = cfg.Config().get('monitor')
+
         # Check state of toggle menu. If on, then start monitoring, else stop
         if self.__menu_item_monitor.IsChecked():
             self.__log.info("Starting monitoring for changes to coefficients.")
@@ -223,21 +342,22 @@ class CorrelationMDIFrame(wx.MDIParentFrame):
             self.__statusbar.SetBackgroundColour('green')
             self.__statusbar.Refresh()
 
-            self.timer.Start(cfg.Config().get('monitor.interval') * 1000)
+            self.timer.Start(HEARTBEAT_INTERVAL * 1000)
 
             # Autosave filename
             filename = self.__opened_filename if self.__opened_filename is not None else 'autosave.cpd'
 
             # Build calculation params and start monitor
-            calculation_params = [cfg.Config().get('monitor.calculations.long'),
-                                  cfg.Config().get('monitor.calculations.medium'),
-                                  cfg.Config().get('monitor.calculations.short')]
+            calculation_params = [monitor['calculations']['long'],
+                                  monitor['calculations']['medium'],
+                                  monitor['calculations']['short']]
 
-            self.cor.start_monitor(interval=cfg.Config().get('monitor.interval'),
+            self.cor.start_monitor(interval=monitor['interval'],
                                    calculation_params=calculation_params,
-                                   cache_time=cfg.Config().get('monitor.tick_cache_time'),
-                                   autosave=cfg.Config().get('monitor.autosave'),
-                                   filename=filename)
+                                   cache_time=monitor['tick_cache_time'],
+                                   autosave=monitor['autosave'],
+                                   filename=filename,
+                                   on_update=self.__get_on_update())
         else:
             self.__log.info("Stopping monitoring.")
             self.SetStatusText("Not Monitoring", 0)
@@ -253,12 +373,48 @@ class CorrelationMDIFrame(wx.MDIParentFrame):
         # Refresh opened child frames
         self.__refresh()
 
+    def __get_on_update(self):
+        """
+        Gets the function for the monitor to call when the coefficients have been updated. The function is called from
+        the monitoring thread and posts an event so that child frames are refreshed on the UI thread. It does nothing
+        once the frame is closing, as a monitor run that is in progress when the frame closes can finish after it has
+        been destroyed.
+        :return: The function
+        """
+        # The closing flag is checked through a local so that the frame isn't touched once it is closing
+        closing = self.__closing
+        return lambda: None if closing.is_set() else wx.PostEvent(self, CoefficientsUpdatedEvent())
+
     def __on_timer(self, evt):
-        # Refresh opened child frames
-        self.__refresh()
+        # Nothing to update if we can't be seen or if the last refresh hasn't finished
+        if self.IsIconized() or not self.IsShownOnScreen() or self.__refreshing:
+            return
+
+        self.__refreshing = True
+        try:
+            # Refresh opened child frames
+            self.__refresh()
 
-        # Set status message
-        self.SetStatusText(f"Status updated at {self.cor.get_last_calculation():%d-%b %H:%M:%S}.", 1)
+            # Set status message if we are monitoring and the data has changed since it was last set. Child frames check
+            # for changes to the data that they show themselves, as they can miss updates while hidden. There is no
+            # last calculation time until the monitor has run.
+            if self.__menu_item_monitor.IsChecked() and self.cor.version != self.__status_version:
+                last_calculation = self.cor.get_last_calculation()
+                if last_calculation is not None:
+                    self.SetStatusText(f"Status updated at {last_calculation:%d-%b %H:%M:%S}.", 1)
+                    self.__status_version = self.cor.version
+        finally:
+            self.__refreshing = False
+
+    def __on_iconize(self, evt):
+        """
+        Window minimised or restored. Refresh child frames when restored, as refreshes are skipped while minimised.
+        :param evt:
+        :return:
+        """
+        evt.Skip()
+        if not evt.IsIconized():
+            wx.CallAfter(self.__refresh)
 
     def __on_view_status(self, evt):
         FrameManager.open_frame(parent=self, frame_module='mt5_correlation.gui.mdi_child_status',
@@ -282,14 +438,15 @@ class CorrelationMDIFrame(wx.MDIParentFrame):
 
     def __refresh(self):
         """
-        Refresh all open child frames
+        Refresh all open child frames. Frames that are minimised or not shown on screen are skipped.
         :return:
         """
         children = self.GetChildren()
 
         for child in children:
             if isinstance(child, CorrelationMDIChild):
-                child.refresh()
+                if child.IsShownOnScreen() and not child.IsIconized():
+                    child.refresh()
             elif isinstance(child, wx.StatusBar) or isinstance(child, ins.InspectionFrame) or \
                     isinstance(child, wxconfig.SettingsDialog):
                 # Ignore
@@ -352,8 +509,23 @@ class FrameManager:
         # If we dont have an opened instance or raise_on_open is False then open new frame, otherwise raise it
         if opened_instance is None or raise_if_open is False:
             if len(kwargs) == 0:
-                clazz(parent=parent).Show(True)
+                frame = clazz(parent=parent)
             else:
-                clazz(parent=parent, **kwargs).Show(True)
+                frame = clazz(parent=parent, **kwargs)
+
+            # Refresh the frame when it is restored, as refreshes are skipped while it is minimised
+            frame.Bind(wx.EVT_ICONIZE, FrameManager.__on_iconize)
+            frame.Show(True)
         else:
             opened_instance.Raise()
+
+    @staticmethod
+    def __on_iconize(evt):
+        """
+        Child frame minimised or restored. Refresh it when restored.
+        :param evt:
+        :return:
+        """
+        evt.Skip()
+        if not evt.IsIconized():
+            wx.CallAfter(evt.GetEventObject().refresh)
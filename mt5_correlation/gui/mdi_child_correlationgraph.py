@@ -1,15 +1,28 @@
 import logging
+
+# Configures matplotlib, so is imported first
+import mt5_correlation.gui.charts as charts
+
+import matplotlib.cm
 import matplotlib.dates
-import matplotlib.pyplot as plt
 import matplotlib.ticker as mticker
+import pandas as pd
 import wx
 import wxconfig as cfg
 import wx.lib.scrolledpanel as scrolled
 
 from matplotlib.backends.backend_wxagg import FigureCanvasWxAgg as FigureCanvas
+from matplotlib.figure import Figure
 
 import mt5_correlation.gui.mdi as mdi
 
+# Date formats for graphs
+TICK_FMT_DATE = matplotlib.dates.DateFormatter('%d-%b')
+TICK_FMT_TIME = matplotlib.dates.DateFormatter('%H:%M:%S')
+
+# Milliseconds to wait after the canvas has been resized before recalculating the layout
+LAYOUT_DELAY = 100
+
 
 class MDIChildCorrelationGraph(mdi.CorrelationMDIChild):
     """
@@ -18,10 +31,6 @@ class MDIChildCorrelationGraph(mdi.CorrelationMDIChild):
 
     symbols = None  # Symbols for correlation. Public as we use to check if window for the symbol pair is already open.
 
-    # Date formats for graphs
-    __tick_fmt_date = matplotlib.dates.DateFormatter('%d-%b')
-    __tick_fmt_time = matplotlib.dates.DateFormatter('%H:%M:%S')
-
     # Colors for graph lines for symbol1 and symbol2. Will use first 2 colours in colormap
     __colours = matplotlib.cm.get_cmap(cfg.Config().get("charts.colormap")).colors
 
@@ -30,6 +39,39 @@ class MDIChildCorrelationGraph(mdi.CorrelationMDIChild):
     __axs = None
     __canvas = None
 
+    # Lines for symbol1 and symbol2 on the price and tick charts. Created once and updated with new data on refresh.
+    __price_lines = None
+    __tick_lines = None
+
+    # Lines for the coefficient history chart, one per monitoring timeframe. Created once and updated with new data on
+    # refresh.
+    __history_lines = None
+
+    # Legend for the coefficient history chart. Created once. Labels are updated if the timeframes change.
+    __history_legend = None
+
+    # Lines showing the divergence threshold and inverse divergence threshold on the coefficient history chart. Created
+    # once and updated on refresh.
+    __threshold_lines = None
+
+    # Tracks the correlation data version, settings and tick data that the graph was last refreshed with, and whether
+    # the last refresh has been drawn. Used by refresh to skip refreshing when nothing has changed.
+    __refresh_tracker = None
+
+    # X axis ranges for charts, cached against the data that they were calculated from. {chart: [data1, data2, range]}
+    __xrange_cache = None
+
+    # X axis ranges last set on the charts. {chart: range}
+    __xranges_set = None
+
+    # Delayed call to recalculate the layout after the canvas has been resized. Restarted on each resize so that the
+    # layout is recalculated once the resizing has finished.
+    __layout_call = None
+
+    # Price data currently plotted on the base coefficient price chart. Price data doesn't change between
+    # calculations so the chart is only replotted when these change.
+    __plotted_price_data = None
+
     def __init__(self, parent, **kwargs):
         # Super
         wx.MDIChildFrame.__init__(self, parent=parent, id=wx.ID_ANY,
@@ -41,6 +83,11 @@ class MDIChildCorrelationGraph(mdi.CorrelationMDIChild):
         # Store the symbols
         self.symbols = kwargs['symbols']
 
+        # Cache for x axis ranges and the ranges last set on the charts
+        self.__xrange_cache = {}
+        self.__xranges_set = {}
+        self.__plotted_price_data = [None, None]
+
         # We will freeze this frame and thaw once constructed to avoid flicker.
         self.Freeze()
 
@@ -49,12 +96,35 @@ class MDIChildCorrelationGraph(mdi.CorrelationMDIChild):
         #   2) Data used to calculate latest coefficient for both symbols (2 lines on chart); and
         #   3) Coefficient history and the divergence threshold lines
 
-        # Create fig and 3 axes.
-        self.__fig, self.__axs = plt.subplots(3)
+        # Create fig and 3 axes. The figure is created directly rather than through pyplot as it is embedded in this
+        # frame and doesn't need to be managed by pyplot.
+        self.__fig = Figure()
+        self.__axs = self.__fig.subplots(3)
 
         # Create additional axis for second line on charts 1 & 2
         self.__s2axs = [self.__axs[0].twinx(), self.__axs[1].twinx()]
 
+        # Create the lines for charts 1 & 2. These will be populated with data in refresh. The x axes are set up for
+        # dates as the lines are created without data.
+        for ax in self.__axs[0:2]:
+            ax.xaxis_date()
+        self.__price_lines = [self.__axs[0].plot([], [], color=self.__colours[0])[0],
+                              self.__s2axs[0].plot([], [], color=self.__colours[1])[0]]
+        self.__tick_lines = [self.__axs[1].plot([], [], color=self.__colours[0])[0],
+                             self.__s2axs[1].plot([], [], color=self.__colours[1])[0]]
+
+        # Create the lines for chart 3, one for each monitoring timeframe. Plotted as markers only. Add the legend for
+        # them.
+        calculations = cfg.Config().get('monitor.calculations')
+        self.__axs[2].xaxis_date()
+        self.__history_lines = [self.__axs[2].plot([], [], linestyle='', marker='.', markersize=1)[0]
+                                for _ in calculations]
+        self.__history_legend = self.__axs[2].legend(self.__history_lines, self.__get_history_labels(calculations))
+
+        # Create the divergence threshold lines for chart 3. These will be positioned and shown in refresh.
+        self.__threshold_lines = [self.__axs[2].axhline(y=0, color="red", label='_nolegend_', linewidth=1,
+                                                        visible=False) for _ in range(0, 2)]
+
         # Set titles
         self.__axs[0].set_title(f"Base Coefficient Price Data for {self.symbols[0]}:{self.symbols[1]}")
         self.__axs[1].set_title(f"Coefficient Tick Data for {self.symbols[0]}:{self.symbols[1]}")
@@ -75,7 +145,16 @@ class MDIChildCorrelationGraph(mdi.CorrelationMDIChild):
         for ax in self.__axs:
             ax.set_xlabel(" ", labelpad=10)
 
-        # Layout with padding between charts
+        # X tick locators, label formats and rotation. These don't change between refreshes so are set once here. The
+        # locator limits the number of ticks to avoid cramped x-labels and places them as the x range changes. Date
+        # format for price data chart, time format for tick data and coefficient history charts.
+        for ax, tick_fmt in zip(self.__axs, [TICK_FMT_DATE, TICK_FMT_TIME, TICK_FMT_TIME]):
+            ax.xaxis.set_major_locator(mticker.MaxNLocator(10))
+            ax.xaxis.set_major_formatter(tick_fmt)
+            ax.tick_params(axis='x', labelrotation=45)
+
+        # Layout with padding between charts. This is calculated here and again when the canvas is resized, not on
+        # every refresh.
         self.__fig.tight_layout(pad=0.5)
 
         # Create panel and sizer. This will provide scrollbar
@@ -85,6 +164,8 @@ class MDIChildCorrelationGraph(mdi.CorrelationMDIChild):
 
         # Add fig to canvas and canvas to sizer. Thaw window to update
         self.__canvas = FigureCanvas(panel, wx.ID_ANY, self.__fig)
+        self.__refresh_tracker = charts.RefreshTracker(self.__canvas, self.refresh)
+        self.__canvas.mpl_connect('resize_event', self.__on_resize)
         sizer.Add(self.__canvas, 1, wx.ALL | wx.EXPAND)
         self.Thaw()
 
@@ -99,19 +180,43 @@ class MDIChildCorrelationGraph(mdi.CorrelationMDIChild):
         Refresh the graph
         :return:
         """
-        # Get the price data for the base coefficient calculation, tick data that was used to calculate last
-        # coefficient and  and the coefficient history data
-        price_data = [self.GetMDIParent().cor.get_price_data(self.symbols[0]),
-                      self.GetMDIParent().cor.get_price_data(self.symbols[1])]
+        # Defer if the last refresh has not yet been drawn. The graph will be refreshed once it has.
+        if self.__refresh_tracker.defer():
+            return
+
+        # Monitoring timeframes. Read once and used for the coefficient history data and legend.
+        calculations = cfg.Config().get('monitor.calculations')
 
+        # Get the tick data that was used to calculate last coefficient
         tick_data = [self.GetMDIParent().cor.get_ticks(self.symbols[0], cache_only=True),
                      self.GetMDIParent().cor.get_ticks(self.symbols[1], cache_only=True)]
 
-        history_data = []
-        for timeframe in cfg.Config().get('monitor.calculations'):
-            frm = cfg.Config().get(f'monitor.calculations.{timeframe}.from')
-            history_data.append(self.GetMDIParent().cor.get_coefficient_history(
-                {'Symbol 1': self.symbols[0], 'Symbol 2': self.symbols[1], 'Timeframe': frm}))
+        # Skip if the data and settings haven't changed since the last refresh. Tick data is compared by identity as it
+        # is replaced rather than updated when new ticks are retrieved.
+        correlation = self.GetMDIParent().cor
+        refresh_with = (correlation.version, correlation.divergence_threshold, correlation.monitor_inverse)
+        if not self.__refresh_tracker.changed(refresh_with, tick_data):
+            return
+
+        # Get the price data for the base coefficient calculation and the coefficient history data
+        price_data = [self.GetMDIParent().cor.get_price_data(self.symbols[0]),
+                      self.GetMDIParent().cor.get_price_data(self.symbols[1])]
+
+        # Filter the history for the symbol pair once, then split it by timeframe. The full history is large, the
+        # history for the pair is not. History can contain multiple plots for different timeframes. They will all be
+        # plotted on the same chart. The history columns are converted to NumPy arrays once and split with a mask for
+        # each timeframe, rather than creating a dataframe for each timeframe.
+        pair_history = self.GetMDIParent().cor.get_coefficient_history({'Symbol 1': self.symbols[0],
+                                                                         'Symbol 2': self.symbols[1]})
+        history_timeframes = pair_history['Timeframe'].to_numpy()
+        history_times = self.__to_date_nums(pair_history['Date To'])
+        history_coefficients = pair_history['Coefficient'].to_numpy()
+        times = []
+        coefficients = []
+        for timeframe in calculations:
+            in_timeframe = history_timeframes == calculations[timeframe]['from']
+            times.append(history_times[in_timeframe])
+            coefficients.append(history_coefficients[in_timeframe])
 
         # Check what data we have available
         price_data_available = price_data is not None and len(price_data) == 2 and price_data[0] is not None and \
@@ -120,96 +225,148 @@ class MDIChildCorrelationGraph(mdi.CorrelationMDIChild):
         tick_data_available = tick_data is not None and len(tick_data) == 2 and tick_data[0] is not None and \
             tick_data[1] is not None and len(tick_data[0]) > 0 and len(tick_data[1]) > 0
 
-        history_data_available = history_data is not None and len(history_data) > 0
+        history_data_available = len(times) > 0
 
-        # Get all plots for coefficient history. History can contain multiple plots for different timeframes. They
-        # will all be plotted on the same chart.
-        times = []
-        coefficients = []
-        if history_data_available:
-            for hist in history_data:
-                times.append(hist['Date To'])
-                coefficients.append(hist['Coefficient'])
+        # Price data is only replotted if it has changed since it was last plotted
+        price_data_changed = price_data_available and \
+            (price_data[0] is not self.__plotted_price_data[0] or price_data[1] is not self.__plotted_price_data[1])
+
+        # Maximum number of points to plot per line
+        max_points = charts.max_points(self.__canvas)
 
         # Update graphs where we have data available
-        if price_data_available:
-            # Update range and ticks
-            xrange = [min(min(price_data[0]['time']), min(price_data[1]['time'])),
-                      max(max(price_data[0]['time']), max(price_data[1]['time']))]
-            self.__axs[0].set_xlim(xrange)
-
-            # Plot both lines
-            self.__axs[0].plot(price_data[0]['time'], price_data[0]['close'],
-                               color=self.__colours[0])
-            self.__s2axs[0].plot(price_data[1]['time'], price_data[1]['close'],
-                                 color=self.__colours[1])
-
-            # Ticks, labels and formats. Fixing xticks with FixedLocator but also using MaxNLocator to avoid
-            # cramped x-labels
-            if len(price_data[0]['time']) > 0:
-                self.__axs[0].xaxis.set_major_locator(mticker.MaxNLocator(10))
-                ticks_loc = self.__axs[0].get_xticks().tolist()
-                self.__axs[0].xaxis.set_major_locator(mticker.FixedLocator(ticks_loc))
-                self.__axs[0].set_xticklabels(ticks_loc)
-                self.__axs[0].xaxis.set_major_formatter(self.__tick_fmt_date)
-                plt.setp(self.__axs[0].xaxis.get_majorticklabels(), rotation=45)
+        if price_data_changed:
+            # Update both lines. Pass NumPy arrays to avoid repeated conversion of the pandas series inside matplotlib.
+            for i in range(0, 2):
+                self.__price_lines[i].set_data(*charts.downsample(price_data[i]['time'].to_numpy(),
+                                                                  price_data[i]['close'].to_numpy(), max_points))
+            self.__rescale_y([self.__axs[0], self.__s2axs[0]])
+
+            # Update range. Ticks will be located for the new range when drawn.
+            self.__set_xrange(chart=0, data=price_data)
+
+            self.__plotted_price_data = [price_data[0], price_data[1]]
 
         if tick_data_available:
-            # Update range and ticks
-            xrange = [min(min(tick_data[0]['time']), min(tick_data[1]['time'])),
-                      max(max(tick_data[0]['time']), max(tick_data[1]['time']))]
-            self.__axs[1].set_xlim(xrange)
-
-            # Plot both lines
-            self.__axs[1].plot(tick_data[0]['time'], tick_data[0]['ask'],
-                               color=self.__colours[0])
-            self.__s2axs[1].plot(tick_data[1]['time'], tick_data[1]['ask'],
-                                 color=self.__colours[1])
-
-            if len(tick_data[0]['time']) > 0:
-                self.__axs[1].xaxis.set_major_locator(mticker.MaxNLocator(10))
-                ticks_loc = self.__axs[1].get_xticks().tolist()
-                self.__axs[1].xaxis.set_major_locator(mticker.FixedLocator(ticks_loc))
-                self.__axs[1].set_xticklabels(ticks_loc)
-                self.__axs[1].xaxis.set_major_formatter(self.__tick_fmt_time)
-                plt.setp(self.__axs[1].xaxis.get_majorticklabels(), rotation=45)
+            # Update both lines. Pass NumPy arrays to avoid repeated conversion of the pandas series inside matplotlib.
+            for i in range(0, 2):
+                self.__tick_lines[i].set_data(*charts.downsample(tick_data[i]['time'].to_numpy(),
+                                                                 tick_data[i]['ask'].to_numpy(), max_points))
+            self.__rescale_y([self.__axs[1], self.__s2axs[1]])
+
+            # Update range. Ticks will be located for the new range when drawn.
+            self.__set_xrange(chart=1, data=tick_data)
 
         if history_data_available:
-            # Plot. There may be more than one set of data for chart. One for each coefficient date range. Convert
-            # single data to list, then loop to plot
-            xdata = times if isinstance(times, list) else [times, ]
-            ydata = coefficients if isinstance(coefficients, list) else [coefficients, ]
-
-            for i in range(0, len(xdata)):
-                self.__axs[2].scatter(xdata[i], ydata[i], s=1)
-
-            # Ticks, labels and formats. Fixing xticks with FixedLocator but also using MaxNLocator to avoid
-            # cramped x-labels
-            if len(times[0].array) > 0:
-                self.__axs[2].xaxis.set_major_locator(mticker.MaxNLocator(10))
-                ticks_loc = self.__axs[2].get_xticks().tolist()
-                self.__axs[2].xaxis.set_major_locator(mticker.FixedLocator(ticks_loc))
-                self.__axs[2].set_xticklabels(ticks_loc)
-                self.__axs[2].xaxis.set_major_formatter(self.__tick_fmt_time)
-                plt.setp(self.__axs[2].xaxis.get_majorticklabels(), rotation=45)
-
-                # Legend
-                self.__axs[2].legend([f"{cfg.Config().get('monitor.calculations.long.from')} Minutes",
-                                      f"{cfg.Config().get('monitor.calculations.medium.from')} Minutes",
-                                      f"{cfg.Config().get('monitor.calculations.short.from')} Minutes"])
-
-                # Lines showing divergence threshold. 2 if we are monitoring inverse correlations.
-                divergence_threshold = self.GetMDIParent().cor.divergence_threshold
-                monitor_inverse = self.GetMDIParent().cor.monitor_inverse
-
-                if divergence_threshold is not None:
-                    self.__axs[2].axhline(y=divergence_threshold, color="red", label='_nolegend_', linewidth=1)
-                    if monitor_inverse:
-                        self.__axs[2].axhline(y=divergence_threshold * -1, color="red", label='_nolegend_', linewidth=1)
-
-        # Redraw canvas
-        self.__canvas.draw()
-
-    def __del__(self):
-        # Close all plots
-        plt.close('all')
+            # Update the line for each coefficient date range. History grows for as long as we are monitoring so is
+            # downsampled. The y limits are fixed, so only the x axis is rescaled.
+            for line, xdata, ydata in zip(self.__history_lines, times, coefficients):
+                line.set_data(*charts.downsample(xdata, ydata, max_points))
+            self.__axs[2].relim()
+            self.__axs[2].autoscale_view(scaley=False)
+
+            # Update legend labels if the timeframes have changed
+            for text, label in zip(self.__history_legend.get_texts(), self.__get_history_labels(calculations)):
+                if text.get_text() != label:
+                    text.set_text(label)
+
+            # Lines showing divergence threshold. 2 if we are monitoring inverse correlations. Only shown if we have
+            # history.
+            divergence_threshold = self.GetMDIParent().cor.divergence_threshold
+            monitor_inverse = self.GetMDIParent().cor.monitor_inverse
+
+            show_threshold = times[0].size > 0 and divergence_threshold is not None
+            if show_threshold:
+                self.__threshold_lines[0].set_ydata([divergence_threshold, divergence_threshold])
+                self.__threshold_lines[1].set_ydata([divergence_threshold * -1, divergence_threshold * -1])
+            self.__threshold_lines[0].set_visible(show_threshold)
+            self.__threshold_lines[1].set_visible(show_threshold and monitor_inverse)
+
+        # Request redraw of canvas. This will be drawn when the application is next idle.
+        self.__refresh_tracker.draw()
+
+    @staticmethod
+    def __to_date_nums(dates):
+        """
+        Converts dates to matplotlib date numbers. The dates are converted in a single vectorised operation rather than
+        by matplotlib converting each date individually when the line data is set.
+        :param dates: Pandas series of dates. Dates may be timezone aware.
+        :return: NumPy array of matplotlib date numbers
+        """
+        return matplotlib.dates.date2num(pd.to_datetime(dates, utc=True).dt.tz_localize(None).to_numpy())
+
+    @staticmethod
+    def __get_history_labels(calculations):
+        """
+        Gets the legend labels for the coefficient history chart
+        :param calculations: The monitoring timeframes from the monitor.calculations config
+        :return: List of labels, one for each monitoring timeframe
+        """
+        return [f"{calculations[timeframe]['from']} Minutes" for timeframe in calculations]
+
+    def __on_resize(self, event):
+        """
+        Canvas has been resized. Recalculate the layout for the new size once no further resize has occurred for
+        LAYOUT_DELAY milliseconds.
+        :param event:
+        :return:
+        """
+        if self.__layout_call is not None and self.__layout_call.IsRunning():
+            self.__layout_call.Restart(LAYOUT_DELAY)
+        else:
+            self.__layout_call = wx.CallLater(LAYOUT_DELAY, self.__layout)
+
+    def __layout(self):
+        """
+        Recalculate the layout and request a redraw of the canvas
+        :return:
+        """
+        # Nothing to do if the frame was closed while the call was waiting
+        if not self:
+            return
+
+        self.__fig.tight_layout(pad=0.5)
+        self.__canvas.draw_idle()
+
+    @staticmethod
+    def __rescale_y(axes):
+        """
+        Rescales the y axis of each of the specified axes to fit the data in their lines
+        :param axes: List of axes to rescale
+        :return:
+        """
+        for ax in axes:
+            ax.relim()
+            ax.autoscale_view(scalex=False)
+
+    def __set_xrange(self, chart, data):
+        """
+        Sets the x axis range of the chart to cover the times in both sets of data. The range is only set if it has
+        changed since it was last set.
+        :param chart: The index of the chart to set the range for
+        :param data: List containing the price or tick data for both symbols
+        :return:
+        """
+        xrange = self.__get_xrange(chart=chart, data=data)
+        if xrange != self.__xranges_set.get(chart):
+            self.__axs[chart].set_xlim(xrange)
+            self.__xranges_set[chart] = xrange
+
+    def __get_xrange(self, chart, data):
+        """
+        Gets the x axis range covering the times in both sets of data. Ranges are cached against the data that they
+        were calculated from and are only recalculated when the data changes. Price and tick data from MetaTrader5 is
+        sorted by time so the range is taken from the first and last times of each set.
+        :param chart: The index of the chart that the range is for
+        :param data: List containing the price or tick data for both symbols
+        :return: [min time, max time]
+        """
+        cached = self.__xrange_cache.get(chart)
+        if cached is not None and cached[0] is data[0] and cached[1] is data[1]:
+            return cached[2]
+
+        times = [data[0]['time'].values, data[1]['time'].values]
+        xrange = [min(times[0][0], times[1][0]), max(times[0][-1], times[1][-1])]
+        self.__xrange_cache[chart] = [data[0], data[1], xrange]
+
+        return xrange
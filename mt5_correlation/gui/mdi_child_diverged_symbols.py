@@ -24,6 +24,10 @@ class MDIChildDivergedSymbols(mdi.CorrelationMDIChild):
     # Number of rows. Required for and updated by refresh method
     __rows = 0
 
+    # The correlation data version that the grid was last refreshed with. Used by refresh method to skip refreshing
+    # when nothing has changed.
+    __refreshed_with = None
+
     __log = None  # The logger
 
     def __init__(self, parent):
@@ -67,32 +71,39 @@ class MDIChildDivergedSymbols(mdi.CorrelationMDIChild):
         Refreshes grid. Notifies if rows have been added or deleted.
         :return:
         """
-        self.__log.debug(f"Refreshing grid.")
-
-        # Update data
-        self.__table.data = self.GetMDIParent().cor.diverged_symbols.copy()
-
-        # Start refresh
-        self.__grid.BeginBatch()
-
-        # Check if num rows in dataframe has changed, and send appropriate APPEND or DELETE messages
-        cur_rows = len(self.GetMDIParent().cor.diverged_symbols.index)
-        if cur_rows < self.__rows:
-            # Data has been deleted. Send message
-            msg = wx.grid.GridTableMessage(self.__table, wx.grid.GRIDTABLE_NOTIFY_ROWS_DELETED,
-                                           self.__rows - cur_rows, self.__rows - cur_rows)
-            self.__grid.ProcessTableMessage(msg)
-        elif cur_rows > self.__rows:
-            # Data has been added. Send message
-            msg = wx.grid.GridTableMessage(self.__table, wx.grid.GRIDTABLE_NOTIFY_ROWS_APPENDED,
-                                           cur_rows - self.__rows)  # how many
-            self.__grid.ProcessTableMessage(msg)
+        # Nothing to do if the data hasn't changed since the last refresh. Diverged symbols are derived from the
+        # correlation statuses, which only change when the data version changes.
+        correlation = self.GetMDIParent().cor
+        if correlation.version == self.__refreshed_with:
+            return
+        self.__refreshed_with = correlation.version
 
-        self.__grid.EndBatch()
+        self.__log.debug(f"Refreshing grid.")
 
-        # Send updated message
-        msg = wx.grid.GridTableMessage(self.__table, wx.grid.GRIDTABLE_REQUEST_VIEW_GET_VALUES)
-        self.__grid.ProcessTableMessage(msg)
+        # Update data. Diverged symbols are created on request so we can hold them without copying.
+        self.__table.data = correlation.diverged_symbols
+
+        # Check if num rows in dataframe has changed, and send appropriate APPEND or DELETE messages. Rows are deleted
+        # from the end of the grid. Messages are batched. The whole grid is repainted once when the batch ends.
+        cur_rows = len(self.__table.data.index)
+        if cur_rows != self.__rows:
+            self.__grid.BeginBatch()
+            if cur_rows < self.__rows:
+                # Data has been deleted. Send message
+                msg = wx.grid.GridTableMessage(self.__table, wx.grid.GRIDTABLE_NOTIFY_ROWS_DELETED,
+                                               cur_rows,  # position
+                                               self.__rows - cur_rows)  # how many
+                self.__grid.ProcessTableMessage(msg)
+            else:
+                # Data has been added. Send message
+                msg = wx.grid.GridTableMessage(self.__table, wx.grid.GRIDTABLE_NOTIFY_ROWS_APPENDED,
+                                               cur_rows - self.__rows)  # how many
+                self.__grid.ProcessTableMessage(msg)
+            self.__grid.EndBatch()
+        else:
+            # Only values have changed. Repaint the cells but not the labels, which are unchanged. Only the visible
+            # cells are repainted, showing the updated values.
+            self.__grid.GetGridWindow().Refresh(eraseBackground=False)
 
         # Update row count
         self.__rows = cur_rows
@@ -117,27 +128,52 @@ class _DataTable(wx.grid.GridTableBase):
     """
     A data table that holds data in a pandas dataframe.
     """
-    data = None  # The data for this table. A Pandas DataFrame
+    __data = None  # The data for this table. A Pandas DataFrame. Accessed through data property.
+
+    # The columns and index of the data as NumPy arrays. Cached when data is set for fast access to cell values.
+    __columns = None
+    __index = None
 
     def __init__(self, columns):
         wx.grid.GridTableBase.__init__(self)
         self.headerRows = 1
         self.data = pd.DataFrame(columns=columns)
 
+    @property
+    def data(self):
+        """
+        :return: The data for this table. A Pandas DataFrame
+        """
+        return self.__data
+
+    @data.setter
+    def data(self, data):
+        """
+        Sets the data for this table and caches its columns and index as NumPy arrays
+        :param data: A Pandas DataFrame
+        :return:
+        """
+        self.__data = data
+        self.__columns = [data[column].to_numpy() for column in data.columns]
+        self.__index = data.index.to_numpy()
+
     def GetNumberRows(self):
-        return len(self.data)
+        return len(self.__index)
 
     def GetNumberCols(self):
-        return len(self.data.columns) + 1
+        return len(self.__columns) + 1
 
     def GetValue(self, row, col):
-        if row < self.RowsCount and col < self.ColsCount:
-            return self.data.index[row] if col == 0 else self.data.iloc[row, col - 1]
+        # Bounds are checked against the cached arrays rather than through the grid, which would call back into
+        # GetNumberRows and GetNumberCols for every cell.
+        if row < len(self.__index) and col <= len(self.__columns):
+            return self.__index[row] if col == 0 else self.__columns[col - 1][row]
         else:
             raise Exception(f"Trying to access row {row} and col {col} which does not exist.")
 
     def SetValue(self, row, col, value):
-        self.data.iloc[row, col - 1] = value
+        self.__data.iloc[row, col - 1] = value
+        self.__columns[col - 1] = self.__data.iloc[:, col - 1].to_numpy()
 
     def GetColLabelValue(self, col):
         if col == 0:
@@ -151,6 +187,5 @@ class _DataTable(wx.grid.GridTableBase):
         return wx.grid.GRID_VALUE_STRING
 
     def GetAttr(self, row, col, prop):
-        attr = wx.grid.GridCellAttr()
-
-        return attr
+        # No cells are highlighted. Returning None tells the grid to use the default attributes.
+        return None
@@ -1,18 +1,26 @@
 import logging
+
+# Configures matplotlib, so is imported first
+import mt5_correlation.gui.charts as charts
+
+import matplotlib.cm
 import matplotlib.dates
-import matplotlib.pyplot as plt
 import matplotlib.ticker as mticker
 import wx
 import wx.lib.scrolledpanel as scrolled
 import wxconfig as cfg
 
 from matplotlib.backends.backend_wxagg import FigureCanvasWxAgg as FigureCanvas
+from matplotlib.figure import Figure
 from mpl_toolkits.axes_grid1 import host_subplot
 from mpl_toolkits import axisartist
 
 import mt5_correlation.gui.mdi as mdi
 from mt5_correlation import correlation as cor
 
+# Date format for graphs
+TICK_FMT_TIME = matplotlib.dates.DateFormatter('%H:%M:%S')
+
 
 class MDIChildDivergedGraph(mdi.CorrelationMDIChild):
     """
@@ -24,20 +32,28 @@ class MDIChildDivergedGraph(mdi.CorrelationMDIChild):
     # Logger
     __log = None
 
-    # Date formats for graphs
-    __tick_fmt_date = matplotlib.dates.DateFormatter('%d-%b')
-    __tick_fmt_time = matplotlib.dates.DateFormatter('%H:%M:%S')
-
     # Graph Canvas
     __canvas = None
 
     # Colors for graph lines
     __colours = matplotlib.cm.get_cmap(cfg.Config().get("charts.colormap")).colors
 
-    # We will store the other symbols last plotted. This will save us rebuilding teh figure if teh symbols haven't
+    # We will store the other symbols last plotted. This will save us rebuilding the figure if the symbols haven't
     # changed.
     __other_symbols = None
 
+    # The axes, one per other symbol, and the lines for the base and other symbol on each. Reused while the other
+    # symbols are unchanged. {other symbol: [base symbol line, other symbol line]}
+    __axs = None
+    __lines = None
+
+    # The x axis range last set on the shared x axis
+    __xrange = None
+
+    # Tracks the correlation data version, settings and tick data that the graph was last refreshed with, and whether
+    # the last refresh has been drawn. Used by refresh to skip refreshing when nothing has changed.
+    __refresh_tracker = None
+
     def __init__(self, parent, **kwargs):
         # Super
         wx.MDIChildFrame.__init__(self, parent=parent, id=wx.ID_ANY,
@@ -54,8 +70,11 @@ class MDIChildDivergedGraph(mdi.CorrelationMDIChild):
         sizer = wx.BoxSizer()
         panel.SetSizer(sizer)
 
-        # Create figure and canvas. Add canvas to sizer
-        self.__canvas = FigureCanvas(panel, wx.ID_ANY, plt.figure())
+        # Create figure and canvas. Add canvas to sizer. Figure uses constrained layout so that the layout is
+        # calculated as part of the draw rather than by an additional layout pass on every refresh. The figure is
+        # created directly rather than through pyplot as it is embedded in this frame.
+        self.__canvas = FigureCanvas(panel, wx.ID_ANY, Figure(constrained_layout=True))
+        self.__refresh_tracker = charts.RefreshTracker(self.__canvas, self.refresh)
         panel.GetSizer().Add(self.__canvas, 1, wx.ALL | wx.EXPAND)
         panel.SetupScrolling()
 
@@ -67,41 +86,88 @@ class MDIChildDivergedGraph(mdi.CorrelationMDIChild):
         Refresh the graph
         :return:
         """
-
-        # Get tick data for base symbol
-        symbol_tick_data = self.GetMDIParent().cor.get_ticks(self.symbol, cache_only=True)
-
-        # Get the other symbols and their tick data
-        other_symbols_data = self.__get_other_symbols_data()
-
-        # Delete all axes from the figure. They will need to be recreated as the symbols may be different
+        # Defer if the last refresh has not yet been drawn. The graph will be refreshed once it has.
+        if self.__refresh_tracker.defer():
+            return
+
+        correlation = self.GetMDIParent().cor
+
+        # Get the symbols that this one has diverged against. These can only change when the data or settings change,
+        # so we only need to get them again if they have. Otherwise, use the ones last plotted.
+        refresh_with = (correlation.version, correlation.monitoring_threshold, correlation.divergence_threshold,
+                        correlation.monitor_inverse)
+        other_symbols = self.__get_other_symbols() if refresh_with != self.__refresh_tracker.refreshed_with \
+            else self.__other_symbols
+
+        # Get tick data for base symbol and other symbols
+        symbol_tick_data = correlation.get_ticks(self.symbol, cache_only=True)
+        other_symbols_data = {symbol: correlation.get_ticks(symbol, cache_only=True) for symbol in other_symbols}
+
+        # Skip if the data and settings haven't changed since the last refresh
+        ticks = [symbol_tick_data] + list(other_symbols_data.values())
+        if not self.__refresh_tracker.changed(refresh_with, ticks):
+            return
+
+        # Recreate the axes if the other symbols have changed. Otherwise we will reuse the existing axes and lines.
+        if other_symbols != self.__other_symbols:
+            self.__create_axes(other_symbols)
+            self.__other_symbols = other_symbols
+
+        # Update the lines for all other symbols. Downsample so that we don't plot more points than can be displayed on
+        # the canvas. The base symbol is plotted on every axes, so its data is converted and downsampled once. There is
+        # nothing to plot if there are no other symbols or if there is no tick data for the base symbol, which will be
+        # the case until the monitor has run.
+        if len(other_symbols) > 0 and symbol_tick_data is not None:
+            max_points = charts.max_points(self.__canvas)
+            symbol_xy = charts.downsample(symbol_tick_data['time'].to_numpy(), symbol_tick_data['ask'].to_numpy(),
+                                          max_points)
+            for other_symbol in other_symbols:
+                other_data = other_symbols_data[other_symbol]
+                other_xy = charts.downsample(other_data['time'].to_numpy(), other_data['ask'].to_numpy(), max_points)
+                for line, xy in zip(self.__lines[other_symbol], [symbol_xy, other_xy]):
+                    line.set_data(*xy)
+                    line.axes.relim()
+                    line.axes.autoscale_view(scalex=False)
+
+        # Set the range of the shared x axis to cover the times of all symbols if it has changed. Tick data from
+        # MetaTrader5 is sorted by time so the range is taken from the first and last times of each set.
+        times = [data['time'].to_numpy() for data in ticks if data is not None and len(data.index) > 0]
+        if len(times) > 0 and len(self.__axs) > 0:
+            xrange = [min(t[0] for t in times), max(t[-1] for t in times)]
+            if xrange != self.__xrange:
+                self.__axs[-1].set_xlim(xrange)
+                self.__xrange = xrange
+
+        # Request redraw of canvas. This will be drawn when the application is next idle.
+        self.__refresh_tracker.draw()
+
+    def __create_axes(self, other_symbols):
+        """
+        Removes all axes from the figure, then creates an axes and lines for every other symbol. The x axis is shared.
+        :param other_symbols: The symbols to create the axes for
+        :return:
+        """
+        # Delete all axes from the figure. The x axis range will need to be set on the new axes.
         for axes in self.__canvas.figure.axes:
             axes.remove()
+        self.__xrange = None
 
-        # Plot for all other symbols
-        num_subplots = 1 if len(other_symbols_data.keys()) == 0 else len(other_symbols_data.keys())
-        plotnum = 1
-        axs = []  # Store the axes for sharing x axis
-        for other_symbol in other_symbols_data:
-            axs.append(self.__canvas.figure.add_subplot(num_subplots, 1, plotnum))
-            self.__plot(axes=axs[-1], base_symbol=self.symbol, other_symbol=other_symbol,
-                        base_symbol_data=symbol_tick_data, other_symbol_data=other_symbols_data[other_symbol])
-
-            # Next plot
-            plotnum += 1
+        # Create axes and plot for all other symbols
+        self.__axs = []
+        self.__lines = {}
+        for plotnum, other_symbol in enumerate(other_symbols, start=1):
+            self.__axs.append(self.__canvas.figure.add_subplot(len(other_symbols), 1, plotnum))
+            self.__lines[other_symbol] = self.__plot(axes=self.__axs[-1], base_symbol=self.symbol,
+                                                     other_symbol=other_symbol)
 
         # Share x axis of the last axes with all the others
-        self.__share_xaxis(axs)
-
-        # Redraw canvas
-        self.__canvas.figure.tight_layout(pad=0.5)
-        self.__canvas.draw()
+        self.__share_xaxis(self.__axs)
 
-    def __get_other_symbols_data(self):
+    def __get_other_symbols(self):
         """
-        Gets the data required for the graphs
+        Gets the symbols that this one has diverged against
         :param self:
-        :return: dict of other symbols their tick data
+        :return: list of other symbols
         """
         # Get the symbols that this one has diverged against.
         data = self.GetMDIParent().cor.filtered_coefficient_data
@@ -120,20 +186,15 @@ class MDIChildDivergedGraph(mdi.CorrelationMDIChild):
         if self.symbol in other_symbols:
             other_symbols.remove(self.symbol)
 
-        # Get the tick data other symbols and add to dict
-        other_tick_data = {}
-        for symbol in other_symbols:
-            tick_data = self.GetMDIParent().cor.get_ticks(symbol, cache_only=True)
-            other_tick_data[symbol] = tick_data
+        return other_symbols
 
-        return other_tick_data
-
-    def __plot(self, axes, base_symbol, other_symbol, base_symbol_data, other_symbol_data):
+    def __plot(self, axes, base_symbol, other_symbol):
         """
-        Plots the data on the axes
+        Creates the lines for the base and other symbol on the axes. Lines are created without data.
         :param axes: The subplot to plot onto
         :param base_symbol
         :param other_symbol:
+        :return: [base symbol line, other symbol line]
         """
         # Create the other axes. Will need an axes for the base symbol data and another for the other symbol data
         other_axes = axes.twinx()
@@ -147,9 +208,9 @@ class MDIChildDivergedGraph(mdi.CorrelationMDIChild):
         self.__set_axes_color(axes, self.__colours[0], 'left')
         self.__set_axes_color(other_axes, self.__colours[1], 'right')
 
-        # Plot both lines
-        axes.plot(base_symbol_data['time'], base_symbol_data['ask'], color=self.__colours[0])
-        other_axes.plot(other_symbol_data['time'], other_symbol_data['ask'], color=self.__colours[1])
+        # Create both lines. The x axis is set up for dates as the lines are created without data.
+        axes.xaxis_date()
+        return [axes.plot([], [], color=self.__colours[0])[0], other_axes.plot([], [], color=self.__colours[1])[0]]
 
     @staticmethod
     def __set_axes_color(axes, color, axis_loc='right'):
@@ -164,7 +225,8 @@ class MDIChildDivergedGraph(mdi.CorrelationMDIChild):
         axes.spines[axis_loc].set_color(color)
         axes.tick_params(axis='y', colors=color)
 
-    def __share_xaxis(self, axs):
+    @staticmethod
+    def __share_xaxis(axs):
         """
         Share the xaxis of the last axes with all other axes. Remove axis tick labels for all but the last. Format axis
         tick labels for the last.
@@ -174,21 +236,14 @@ class MDIChildDivergedGraph(mdi.CorrelationMDIChild):
         if len(axs) > 0:
             last_ax = axs[-1]
             for ax in axs:
-                # If we are not on the last one, share and hide tick labels. If we are on the last one, format tick
-                # labels.
+                # If we are not on the last one, share and hide tick labels. If we are on the last one, set the
+                # locator and format tick labels. The locator limits the number of ticks to avoid cramped x-labels and
+                # places them as the x range changes. Tick labels are hidden on the axis rather than on the current
+                # labels so that they remain hidden as ticks are added.
                 if ax != last_ax:
                     ax.sharex(last_ax)
-                    plt.setp(ax.xaxis.get_majorticklabels(), visible=False)
+                    ax.tick_params(axis='x', labelbottom=False)
                 else:
-                    # Ticks, labels and formats. Fixing xticks with FixedLocator but also using MaxNLocator to avoid
-                    # cramped x-labels
                     ax.xaxis.set_major_locator(mticker.MaxNLocator(10))
-                    ticks_loc = ax.get_xticks().tolist()
-                    ax.xaxis.set_major_locator(mticker.FixedLocator(ticks_loc))
-                    ax.set_xticklabels(ticks_loc)
-                    ax.xaxis.set_major_formatter(self.__tick_fmt_time)
-                    plt.setp(ax.xaxis.get_majorticklabels(), rotation=45)
-
-    def __del__(self):
-        # Close all plots
-        plt.close('all')
+                    ax.xaxis.set_major_formatter(TICK_FMT_TIME)
+                    ax.tick_params(axis='x', labelrotation=45)
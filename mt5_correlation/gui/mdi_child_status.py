@@ -1,4 +1,5 @@
 import logging
+import numpy as np
 import pandas as pd
 import wx
 import wx.grid
@@ -30,6 +31,10 @@ class MDIChildStatus(mdi.CorrelationMDIChild):
     # Number of rows. Required for and updated by refresh method
     __rows = 0
 
+    # The correlation data version and filter settings that the grid was last refreshed with. Used by refresh method
+    # to skip refreshing when nothing has changed.
+    __refreshed_with = None
+
     __log = None  # The logger
 
     def __init__(self, parent):
@@ -79,42 +84,85 @@ class MDIChildStatus(mdi.CorrelationMDIChild):
         Refreshes grid. Notifies if rows have been added or deleted.
         :return:
         """
+        # Nothing to do if neither the data nor the settings used to filter it have changed since the last refresh
+        correlation = self.GetMDIParent().cor
+        refresh_with = (correlation.version, correlation.monitoring_threshold, correlation.monitor_inverse)
+        if refresh_with == self.__refreshed_with:
+            return
+        self.__refreshed_with = refresh_with
+
         self.__log.debug(f"Refreshing grid.")
 
-        # Update data
-        self.__table.data = self.GetMDIParent().cor.filtered_coefficient_data.copy()
-
-        # Format
-        self.__table.data.loc[:, 'Base Coefficient'] = self.__table.data['Base Coefficient'].map('{:.5f}'.format)
-        self.__table.data.loc[:, 'Last Calculation'] = pd.to_datetime(self.__table.data['Last Calculation'], utc=True)
-        self.__table.data.loc[:, 'Last Calculation'] = \
-            self.__table.data['Last Calculation'].dt.strftime('%d-%m-%y %H:%M:%S')
-
-        # Start refresh
-        self.__grid.BeginBatch()
-
-        # Check if num rows in dataframe has changed, and send appropriate APPEND or DELETE messages
-        cur_rows = len(self.GetMDIParent().cor.filtered_coefficient_data.index)
-        if cur_rows < self.__rows:
-            # Data has been deleted. Send message
-            msg = wx.grid.GridTableMessage(self.__table, wx.grid.GRIDTABLE_NOTIFY_ROWS_DELETED,
-                                           self.__rows - cur_rows, self.__rows - cur_rows)
-            self.__grid.ProcessTableMessage(msg)
-        elif cur_rows > self.__rows:
-            # Data has been added. Send message
-            msg = wx.grid.GridTableMessage(self.__table, wx.grid.GRIDTABLE_NOTIFY_ROWS_APPENDED,
-                                           cur_rows - self.__rows)  # how many
-            self.__grid.ProcessTableMessage(msg)
-
-        self.__grid.EndBatch()
-
-        # Send updated message
-        msg = wx.grid.GridTableMessage(self.__table, wx.grid.GRIDTABLE_REQUEST_VIEW_GET_VALUES)
-        self.__grid.ProcessTableMessage(msg)
+        # Update data. Filtered coefficient data is created on request so we can hold it without copying. The table
+        # formats values as they are displayed. Keep the previous data so that we can find the rows that have changed.
+        previous_data = self.__table.data
+        self.__table.data = correlation.filtered_coefficient_data
+
+        # Check if num rows in dataframe has changed, and send appropriate APPEND or DELETE messages. Rows are deleted
+        # from the end of the grid. Messages are batched. The whole grid is repainted once when the batch ends.
+        cur_rows = len(self.__table.data.index)
+        if cur_rows != self.__rows:
+            self.__grid.BeginBatch()
+            if cur_rows < self.__rows:
+                # Data has been deleted. Send message
+                msg = wx.grid.GridTableMessage(self.__table, wx.grid.GRIDTABLE_NOTIFY_ROWS_DELETED,
+                                               cur_rows,  # position
+                                               self.__rows - cur_rows)  # how many
+                self.__grid.ProcessTableMessage(msg)
+            else:
+                # Data has been added. Send message
+                msg = wx.grid.GridTableMessage(self.__table, wx.grid.GRIDTABLE_NOTIFY_ROWS_APPENDED,
+                                               cur_rows - self.__rows)  # how many
+                self.__grid.ProcessTableMessage(msg)
+            self.__grid.EndBatch()
+        else:
+            # Only values have changed. Repaint the rows that have changed, or all cells if rows have been reordered.
+            # The labels are unchanged so are not repainted. Only the visible cells are repainted, showing the updated
+            # values.
+            changed_rows = self.__get_changed_rows(previous_data, self.__table.data)
+            if changed_rows is None:
+                self.__grid.GetGridWindow().Refresh(eraseBackground=False)
+            else:
+                # Repaint each contiguous band of changed rows
+                for rows in np.split(changed_rows, np.flatnonzero(np.diff(changed_rows) != 1) + 1):
+                    if len(rows) > 0:
+                        self.__refresh_rows(int(rows[0]), int(rows[-1]))
 
         # Update row count
         self.__rows = cur_rows
 
+    def __refresh_rows(self, first_row, last_row):
+        """
+        Repaints the cells in a band of rows. The band is calculated from the cell positions, which are converted to the
+        scrolled position in the grid window.
+        :param first_row: The first row to repaint
+        :param last_row: The last row to repaint
+        :return:
+        """
+        top = self.__grid.CellToRect(first_row, 0).GetTop()
+        bottom = self.__grid.CellToRect(last_row, 0).GetBottom()
+        _, scrolled_top = self.__grid.CalcScrolledPosition(0, top)
+
+        grid_window = self.__grid.GetGridWindow()
+        grid_window.RefreshRect(wx.Rect(0, scrolled_top, grid_window.GetClientSize().GetWidth(), bottom - top + 1),
+                                eraseBackground=False)
+
+    @staticmethod
+    def __get_changed_rows(previous, current):
+        """
+        Gets the positions of the rows whose values have changed
+        :param previous: The data previously shown in the grid
+        :param current: The data now shown in the grid
+        :return: NumPy array of the positions of the changed rows, or None if rows have been added, removed or
+            reordered.
+        """
+        if previous is None or not previous.index.equals(current.index) or not previous.columns.equals(current.columns):
+            return None
+
+        # Values that are missing in both are unchanged
+        changed = (previous != current) & ~(previous.isna() & current.isna())
+        return np.flatnonzero(changed.any(axis=1).to_numpy())
+
     def __on_doubleckick_row(self, evt):
         """
         Open the graphs when a row is doubleclicked.
@@ -132,31 +180,104 @@ class MDIChildStatus(mdi.CorrelationMDIChild):
                                     symbols=[symbol1, symbol2])
 
 
+def _format_coefficient(value):
+    """
+    Formats a coefficient for display
+    :param value: The coefficient. Can be NaN or None if not calculated.
+    :return: The coefficient to 5 decimal places or blank if not calculated
+    """
+    return "" if pd.isna(value) else f"{value:.5f}"
+
+
+def _format_datetime(value):
+    """
+    Formats a date and time for display
+    :param value: The date and time. Can be NaT or NaN if not set.
+    :return: The formatted date and time or blank if not set
+    """
+    return "" if pd.isna(value) else value.strftime('%d-%m-%y %H:%M:%S')
+
+
 class _DataTable(wx.grid.GridTableBase):
     """
-    A data table that holds data in a pandas dataframe. Contains highlighting rules for status.
+    A data table that holds data in a pandas dataframe. Contains highlighting rules for status and formats values as
+    they are displayed.
     """
-    data = None  # The data for this table. A Pandas DataFrame
+    __data = None  # The data for this table. A Pandas DataFrame. Accessed through data property.
+
+    # The columns and index of the data as NumPy arrays. Cached when data is set for fast access to cell values.
+    __columns = None
+    __index = None
+
+    # Formatters for columns that are not displayed as they are stored. {column: formatter}
+    __formatters = {COLUMN_BASE_COEFFICIENT: _format_coefficient, COLUMN_LAST_CALCULATION: _format_datetime}
+
+    # Cell attributes for status highlighting. Created once and reused for every cell. Status attributes are looked up
+    # by status val. Statuses that are not in the lookup use the other attribute.
+    __status_attrs = None
+    __attr_other = None
+
+    # The status attribute for each row. Looked up when data is set so that GetAttr doesn't need to for every cell.
+    # None for rows whose status has not been set.
+    __row_attrs = None
 
     def __init__(self, columns):
         wx.grid.GridTableBase.__init__(self)
         self.headerRows = 1
+
+        self.__status_attrs = {}
+        for status, colour in [(cor.STATUS_DIVERGING, wx.RED), (cor.STATUS_CONVERGING, wx.GREEN)]:
+            self.__status_attrs[status.val] = wx.grid.GridCellAttr()
+            self.__status_attrs[status.val].SetBackgroundColour(colour)
+        self.__attr_other = wx.grid.GridCellAttr()
+        self.__attr_other.SetBackgroundColour(wx.WHITE)
+
         self.data = pd.DataFrame(columns=columns)
 
+    @property
+    def data(self):
+        """
+        :return: The data for this table. A Pandas DataFrame
+        """
+        return self.__data
+
+    @data.setter
+    def data(self, data):
+        """
+        Sets the data for this table and caches its columns and index as NumPy arrays, and the status attribute for
+        each row
+        :param data: A Pandas DataFrame
+        :return:
+        """
+        self.__data = data
+        self.__columns = [data[column].to_numpy() for column in data.columns]
+        self.__index = data.index.to_numpy()
+        self.__cache_row_attrs()
+
     def GetNumberRows(self):
-        return len(self.data)
+        return len(self.__index)
 
     def GetNumberCols(self):
-        return len(self.data.columns) + 1
+        return len(self.__columns) + 1
 
     def GetValue(self, row, col):
-        if row < self.RowsCount and col < self.ColsCount:
-            return self.data.index[row] if col == 0 else self.data.iloc[row, col - 1]
+        # Bounds are checked against the cached arrays rather than through the grid, which would call back into
+        # GetNumberRows and GetNumberCols for every cell.
+        if row < len(self.__index) and col <= len(self.__columns):
+            if col == 0:
+                return self.__index[row]
+
+            value = self.__columns[col - 1][row]
+            formatter = self.__formatters.get(col)
+            return value if formatter is None else formatter(value)
         else:
             raise Exception(f"Trying to access row {row} and col {col} which does not exist.")
 
     def SetValue(self, row, col, value):
-        self.data.iloc[row, col - 1] = value
+        self.__data.iloc[row, col - 1] = value
+        self.__columns[col - 1] = self.__data.iloc[:, col - 1].to_numpy()
+        if col == COLUMN_STATUS:
+            self.__cache_row_attrs()
 
     def GetColLabelValue(self, col):
         if col == 0:
@@ -170,20 +291,26 @@ class _DataTable(wx.grid.GridTableBase):
         return wx.grid.GRID_VALUE_STRING
 
     def GetAttr(self, row, col, prop):
-        attr = wx.grid.GridCellAttr()
-
-        # Check that we are not out of bounds
-        if row < self.RowsCount:
-            # If column is status, check and highlight if diverging or converging.
-            if col in [COLUMN_STATUS]:
-                # Is status one of interest
-                value = self.GetValue(row, col)
-                if value != "":
-                    if value in [cor.STATUS_DIVERGING]:
-                        attr.SetBackgroundColour(wx.RED)
-                    elif value in [cor.STATUS_CONVERGING]:
-                        attr.SetBackgroundColour(wx.GREEN)
-                    else:
-                        attr.SetBackgroundColour(wx.WHITE)
+        # Only the status column is highlighted. Returning None tells the grid to use the default attributes.
+        if col != COLUMN_STATUS or row >= len(self.__index):
+            return None
+
+        # Statuses that have not been set yet have no attribute
+        attr = self.__row_attrs[row]
+        if attr is None:
+            return None
+
+        # The grid takes a reference to the returned attribute. Increment the reference count so that our shared
+        # attribute isn't destroyed when the grid releases it.
+        attr.IncRef()
 
         return attr
+
+    def __cache_row_attrs(self):
+        """
+        Looks up the status attribute for each row. Statuses that have not been set yet are blank and have no attribute.
+        :return:
+        """
+        self.__row_attrs = [self.__status_attrs.get(status.val, self.__attr_other)
+                            if isinstance(status, cor.CorrelationStatus) else None
+                            for status in self.__columns[COLUMN_STATUS - 1]]
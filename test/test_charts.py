@@ -0,0 +1,127 @@
+import unittest
+from unittest.mock import MagicMock, patch
+import mt5_correlation.gui.charts as charts
+import numpy as np
+import pandas as pd
+
+
+class TestCharts(unittest.TestCase):
+    """
+    Unit test for the helpers shared by the graph frames.
+    """
+
+    def test_max_points(self):
+        """
+        Test that max points is two per pixel of canvas width, but never less than MIN_POINTS.
+        :return:
+        """
+        canvas = MagicMock()
+
+        canvas.GetSize.return_value.GetWidth.return_value = 1000
+        self.assertEqual(charts.max_points(canvas), 2000)
+
+        canvas.GetSize.return_value.GetWidth.return_value = 100
+        self.assertEqual(charts.max_points(canvas), charts.MIN_POINTS)
+
+    def test_downsample(self):
+        """
+        Test that data with more than max points is reduced to max points or fewer, keeping the minimum and maximum
+        values and the order of the data.
+        :return:
+        """
+        # Data within max points is returned unchanged
+        x = np.arange(10)
+        y = np.random.rand(10)
+        x_ds, y_ds = charts.downsample(x, y, 10)
+        self.assertTrue(np.array_equal(x_ds, x))
+        self.assertTrue(np.array_equal(y_ds, y))
+
+        # Data above max points is downsampled. Use a size that leaves a partial last bucket.
+        x = np.arange(2501)
+        y = np.random.rand(2501)
+        x_ds, y_ds = charts.downsample(x, y, 1000)
+        self.assertLessEqual(len(x_ds), 1000)
+        self.assertEqual(len(x_ds), len(y_ds))
+        self.assertEqual(y_ds.min(), y.min())
+        self.assertEqual(y_ds.max(), y.max())
+        self.assertTrue(np.all(np.diff(x_ds) > 0), "Downsampled data should remain in order.")
+        self.assertTrue(np.array_equal(y[x_ds], y_ds), "Downsampled points should be taken from the original data.")
+
+    def test_downsample_missing(self):
+        """
+        Test that NaN and None y values are ignored when downsampling, and that buckets with no values are kept.
+        :return:
+        """
+        # Every bucket contains NaN. The minimum and maximum of each bucket should be kept, not the NaN.
+        y = np.array([0.1, np.nan, 0.9, 0.5] * 600)
+        x_ds, y_ds = charts.downsample(np.arange(len(y)), y, 1000)
+        self.assertLessEqual(len(x_ds), 1000)
+        self.assertFalse(np.isnan(y_ds).any())
+        self.assertEqual(y_ds.min(), 0.1)
+        self.assertEqual(y_ds.max(), 0.9)
+
+        # None is treated as NaN
+        y = [None, 0.2, 0.8] * 1000
+        x_ds, y_ds = charts.downsample(np.arange(len(y)), y, 1000)
+        self.assertLessEqual(len(x_ds), 1000)
+        self.assertFalse(np.isnan(y_ds).any())
+        self.assertEqual(y_ds.min(), 0.2)
+        self.assertEqual(y_ds.max(), 0.8)
+
+        # Data with no values keeps a point per bucket so that the gap is shown
+        y = np.full(3000, np.nan)
+        x_ds, y_ds = charts.downsample(np.arange(len(y)), y, 1000)
+        self.assertEqual(len(x_ds), 500)
+        self.assertTrue(np.isnan(y_ds).all())
+
+    @patch('mt5_correlation.gui.charts.wx')
+    def test_refresh_tracker(self, mock):
+        """
+        Test that the refresh tracker reports changes to the data, tracks whether the last refresh has been drawn and
+        runs refreshes that were deferred while it was being drawn once it has.
+        :param mock:
+        :return:
+        """
+        canvas = MagicMock()
+        refresh = MagicMock()
+        tracker = charts.RefreshTracker(canvas, refresh)
+
+        # Get the draw event handler that the tracker connected to the canvas
+        event, on_draw = canvas.mpl_connect.call_args[0]
+        self.assertEqual(event, 'draw_event')
+
+        # First refresh is always a change. Same data again is not.
+        ticks = [pd.DataFrame(), pd.DataFrame()]
+        self.assertTrue(tracker.changed((1, 0.8), ticks))
+        self.assertEqual(tracker.refreshed_with, (1, 0.8))
+        self.assertFalse(tracker.changed((1, 0.8), list(ticks)))
+
+        # Changes to version or settings, replaced tick data or a different number of tick data sets are all changes.
+        # Tick data is compared by identity, so equal but replaced tick data is a change.
+        self.assertTrue(tracker.changed((2, 0.8), ticks))
+        self.assertTrue(tracker.changed((2, 0.8), [ticks[0], pd.DataFrame()]))
+        self.assertTrue(tracker.changed((2, 0.8), ticks[:1]))
+
+        # Draw is pending from request until the canvas has drawn. Refreshes aren't deferred when no draw is pending.
+        self.assertFalse(tracker.defer())
+        tracker.draw()
+        self.assertTrue(tracker.draw_pending)
+        canvas.draw_idle.assert_called_once()
+        on_draw(None)
+        self.assertFalse(tracker.draw_pending)
+        mock.CallAfter.assert_not_called()
+
+        # A refresh deferred while a draw is pending is run after the canvas has drawn, once only
+        tracker.draw()
+        self.assertTrue(tracker.defer())
+        self.assertTrue(tracker.defer())
+        on_draw(None)
+        mock.CallAfter.assert_called_once()
+        mock.CallAfter.call_args[0][0]()
+        refresh.assert_called_once()
+        on_draw(None)
+        mock.CallAfter.assert_called_once()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -233,12 +233,15 @@ class TestCorrelation(unittest.TestCase):
         # Start the monitor. Run every second. Use ~10 and ~5 seconds of data. Were not testing the overlap and price
         # data quality metrics here as that is set elsewhere so these can be set to not take effect. Set cache level
         # high and don't use autosave. Timer runs in a separate thread so test can continue after it has started.
+        # Count the updates that the monitor notifies us of.
+        updates = []
         cor.start_monitor(interval=1, calculation_params=[{'from': 0.66, 'min_prices': 0,
                                                            'max_set_size_diff_pct': 0, 'overlap_pct': 0,
                                                            'max_p_value': 1},
                                                           {'from': 0.33, 'min_prices': 0,
                                                            'max_set_size_diff_pct': 0, 'overlap_pct': 0,
-                                                           'max_p_value': 1}], cache_time=100, autosave=False)
+                                                           'max_p_value': 1}], cache_time=100, autosave=False,
+                          on_update=lambda: updates.append(cor.version))
 
         # Wait 2 seconds so timer runs twice
         time.sleep(2)
@@ -246,6 +249,9 @@ class TestCorrelation(unittest.TestCase):
         # Stop the monitor
         cor.stop_monitor()
 
+        # We should have been notified once for each run
+        self.assertEqual(len(updates), 2)
+
         # We should have 2 coefficients calculated for each symbol pair (6), for each date_from value (2),
         # for each run (2) so 24 in total.
         self.assertEqual(len(cor.coefficient_history.index), 24)
@@ -325,6 +331,79 @@ class TestCorrelation(unittest.TestCase):
         # Cleanup. delete the file
         os.remove("unittest.cpd")
 
+    @patch('mt5_correlation.mt5.MetaTrader5')
+    def test_version(self, mock):
+        """
+        Test that the version is incremented when coefficient data or history changes.
+        :param mock:
+        :return:
+        """
+        # Correlation class
+        cor = correlation.Correlation()
+
+        # Version should increase on calculate
+        version = cor.version
+        mock.symbols_get.return_value = self.mock_symbols
+        mock.copy_rates_range.side_effect = [self.mock_base_prices, self.mock_correlated_prices,
+                                             self.mock_uncorrelated_prices, self.mock_inverse_correlated_prices]
+        cor.calculate(date_from=self.start_date, date_to=self.end_date, timeframe=5, min_prices=100,
+                      max_set_size_diff_pct=100, overlap_pct=100, max_p_value=1)
+        self.assertTrue(cor.version > version, "Version should increase when coefficients are calculated.")
+
+        # Version should not change if data is not changed
+        version = cor.version
+        _ = cor.filtered_coefficient_data
+        self.assertEqual(cor.version, version, "Version should not change when data is read.")
+
+        # Version should increase when history is cleared
+        cor.clear_coefficient_history()
+        self.assertTrue(cor.version > version, "Version should increase when coefficient history is cleared.")
+
+        # Version should increase on load
+        version = cor.version
+        cor.save("unittest.cpd")
+        cor.load("unittest.cpd")
+        self.assertTrue(cor.version > version, "Version should increase when data is loaded.")
+
+        # Cleanup. delete the file
+        os.remove("unittest.cpd")
+
+    @patch('mt5_correlation.mt5.MetaTrader5')
+    def test_clear_coefficient_history(self, mock):
+        """
+        Test that clearing the coefficient history clears the history, tick data and status, and increments the version
+        every time so that frames showing the data know to refresh.
+        :param mock:
+        :return:
+        """
+        # Correlation class
+        cor = correlation.Correlation()
+
+        # Calculate
+        mock.symbols_get.return_value = self.mock_symbols
+        mock.copy_rates_range.side_effect = [self.mock_base_prices, self.mock_correlated_prices,
+                                             self.mock_uncorrelated_prices, self.mock_inverse_correlated_prices]
+        cor.calculate(date_from=self.start_date, date_to=self.end_date, timeframe=5, min_prices=100,
+                      max_set_size_diff_pct=100, overlap_pct=100, max_p_value=1)
+
+        # Get some ticks so that they are cached
+        mock.copy_ticks_range.return_value = pd.DataFrame(columns=['time', 'ask'], data=[[self.start_date, 1]])
+        cor.get_ticks('SYMBOL1', date_from=self.start_date, date_to=self.end_date)
+        self.assertIsNotNone(cor.get_ticks('SYMBOL1', cache_only=True), "Ticks should be cached.")
+
+        # Clear. History, cached ticks and status should be cleared and version incremented.
+        version = cor.version
+        cor.clear_coefficient_history()
+        self.assertEqual(len(cor.coefficient_history.index), 0, "History should be cleared.")
+        self.assertIsNone(cor.get_ticks('SYMBOL1', cache_only=True), "Cached ticks should be cleared.")
+        self.assertTrue((cor.coefficient_data['Status'] == '').all(), "Status should be cleared.")
+        self.assertTrue(cor.version > version, "Version should increase when coefficient history is cleared.")
+
+        # Clearing again should increment the version again
+        version = cor.version
+        cor.clear_coefficient_history()
+        self.assertTrue(cor.version > version, "Version should increase every time coefficient history is cleared.")
+
     @patch('mt5_correlation.correlation.Correlation.coefficient_data', new_callable=PropertyMock)
     def test_diverged_symbols(self, mock):
         """